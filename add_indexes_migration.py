@@ -0,0 +1,65 @@
+from app import app
+from extensions import db
+import pymysql
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Indexes declared on the models, as (table, index name, columns)
+INDEXES = [
+    # Schedule conflict checks
+    ('schedules', 'ix_schedules_room_slot', '(semester_id, day_of_week, lab_room_id, start_time)'),
+    ('schedules', 'ix_schedules_section_slot', '(semester_id, day_of_week, section_id, start_time)'),
+    ('schedules', 'ix_schedules_instructor_slot', '(semester_id, day_of_week, instructor_id, start_time)'),
+    # Delta sync
+    ('schedules', 'ix_schedules_updated', '(updated_at, id)'),
+    ('schedule_deletions', 'ix_schedule_deletions_deleted', '(deleted_at, id)'),
+    # User directory prefix search
+    ('users', 'ix_users_last_first', '(last_name, first_name)'),
+    ('users', 'ix_users_first_name', '(first_name)'),
+    # Keyset pagination of a user's notifications
+    ('notifications', 'ix_notifications_user_created', '(user_id, created_at, id)'),
+]
+
+def run_migration():
+    # Get database connection details from environment variables
+    db_user = os.getenv('DB_USER', 'root')
+    db_password = os.getenv('DB_PASSWORD', '')
+    db_host = os.getenv('DB_HOST', 'localhost')
+    db_name = os.getenv('DB_NAME', 'lab_scheduling_system')
+    
+    # Connect to the database
+    connection = pymysql.connect(
+        host=db_host,
+        user=db_user,
+        password=db_password,
+        database=db_name
+    )
+    
+    try:
+        with connection.cursor() as cursor:
+            for table, index_name, columns in INDEXES:
+                # Check if the index already exists
+                cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+                result = cursor.fetchone()
+                
+                # If the index doesn't exist, add it
+                if not result:
+                    print(f"Adding {index_name} index to {table} table...")
+                    cursor.execute(f"CREATE INDEX {index_name} ON {table} {columns}")
+                    connection.commit()
+                    print(f"{index_name} index added successfully!")
+                else:
+                    print(f"{index_name} index already exists.")
+    except Exception as e:
+        print(f"Error during migration: {e}")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    with app.app_context():
+        # Create tables added since the database was set up (e.g. schedule_deletions, schedule_locks, user_imports)
+        db.create_all()
+        run_migration()
@@ -4,6 +4,9 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 from extensions import db, jwt
+from cache import reference_cache
+from calendar_feeds import feed_cache
+from password_hashing import password_hasher
 
 # Load environment variables
 load_dotenv()
@@ -17,9 +20,9 @@ app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 # Configure CORS
 CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"], 
                                 "supports_credentials": True,
-                                "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-                                "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin"],
-                                "expose_headers": ["Content-Type", "Authorization"],
+                                "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+                                "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "If-None-Match"],
+                                "expose_headers": ["Content-Type", "Authorization", "ETag"],
                                 "max_age": 86400}})
 
 # Configure database
@@ -31,9 +34,84 @@ app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
 
+# Seconds a user's role version is cached before re-reading it; role claims in
+# tokens are trusted while their version matches, so other workers' role
+# changes take effect within this delay
+app.config['ROLE_VERSION_TTL'] = int(os.getenv('ROLE_VERSION_TTL', 60))
+
+# Password hashing runs on PASSWORD_HASH_WORKERS threads per process; requests
+# beyond PASSWORD_HASH_MAX_QUEUE waiting ones get a 503. Stored hashes made with
+# another method (e.g. 'pbkdf2:sha256:600000' or 'scrypt') are upgraded at login.
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+app.config['PASSWORD_HASH_MAX_QUEUE'] = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 64))
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2')
+
+# POST /api/users/bulk: largest upload accepted, and the most users created within
+# the request. Every row costs one password hash (about 0.3-0.4s with pbkdf2), so
+# bigger uploads run in the background in batches of USER_BULK_BATCH_SIZE users,
+# each hashed, inserted and committed before the next, with a pollable report
+app.config['USER_BULK_MAX_ROWS'] = int(os.getenv('USER_BULK_MAX_ROWS', 10000))
+app.config['USER_BULK_SYNC_ROWS'] = int(os.getenv('USER_BULK_SYNC_ROWS', 50))
+app.config['USER_BULK_BATCH_SIZE'] = 100
+
+# Default and largest number of results of GET /api/users/search
+app.config['USER_SEARCH_LIMIT'] = 20
+app.config['USER_SEARCH_MAX_LIMIT'] = 100
+
+# Page sizes for list endpoints paginated with ?limit= and ?cursor=
+app.config['PAGE_SIZE_DEFAULT'] = 50
+app.config['PAGE_SIZE_MAX'] = 500
+
+# Largest batch accepted by POST /api/schedules/bulk
+app.config['SCHEDULE_BULK_MAX_ROWS'] = 5000
+
+# Rows fetched per round trip by the streaming schedule export
+app.config['EXPORT_BATCH_SIZE'] = 1000
+
+# Default and largest time budget (seconds) of POST /api/schedules/generate
+app.config['TIMETABLE_TIME_BUDGET'] = 5
+app.config['TIMETABLE_MAX_TIME_BUDGET'] = 30
+
+# Bounds on one generate request: the finest start-time step in minutes, and
+# the number of demands and sessions (meetings) it may ask for
+app.config['TIMETABLE_MIN_STEP'] = 15
+app.config['TIMETABLE_MAX_DEMANDS'] = 500
+app.config['TIMETABLE_MAX_SESSIONS'] = 1000
+
+# Seconds an ETag of a schedule or reference-data response stays valid; the
+# version counters behind it are per worker process
+app.config['ETAG_TTL'] = int(os.getenv('ETAG_TTL', 60))
+
+# Seconds a per-(semester, day) schedule conflict index stays warm before it is
+# reloaded, so writes made by other worker processes are picked up
+app.config['SCHEDULE_INDEX_TTL'] = int(os.getenv('SCHEDULE_INDEX_TTL', 300))
+
+# Disable the in-memory index to run every conflict check as a single SQL query
+app.config['SCHEDULE_INDEX_ENABLED'] = os.getenv('SCHEDULE_INDEX_ENABLED', 'true').lower() == 'true'
+
+# Seconds a weekly section/lab room grid is kept before it is rebuilt, so
+# writes made by other worker processes are picked up
+app.config['TIMETABLE_GRID_TTL'] = int(os.getenv('TIMETABLE_GRID_TTL', 300))
+
+# Seconds before the since watermark that GET /api/schedules/changes re-reads,
+# to cover transactions committed after their rows were stamped
+app.config['SCHEDULE_CHANGES_OVERLAP'] = int(os.getenv('SCHEDULE_CHANGES_OVERLAP', 5))
+
+# Size and lifetime (seconds) of the in-process reference data cache
+app.config['REFERENCE_CACHE_MAXSIZE'] = 256
+app.config['REFERENCE_CACHE_TTL'] = int(os.getenv('REFERENCE_CACHE_TTL', 300))
+
+# Size and lifetime (seconds) of the generated calendar feeds; writes made by
+# other worker processes show up in a feed within the TTL
+app.config['CALENDAR_FEED_CACHE_MAXSIZE'] = 2048
+app.config['CALENDAR_FEED_CACHE_TTL'] = int(os.getenv('CALENDAR_FEED_CACHE_TTL', 300))
+
 # Initialize extensions with app
 db.init_app(app)
 jwt.init_app(app)
+reference_cache.init_app(app)
+feed_cache.init_app(app, 'CALENDAR_FEED_CACHE')
+password_hasher.init_app(app)
 
 # Register blueprints
 def register_blueprints():
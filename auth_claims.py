@@ -0,0 +1,91 @@
+from threading import Lock
+import time
+
+from flask import current_app
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from change_tracking import track_changes
+from extensions import db
+from models import User
+
+def role_claims(user):
+    # Signed into access tokens at login, registration and refresh; rv ties
+    # them to the user's role_version at the time
+    return {
+        'roles': [role.name for role in user.roles],
+        'permissions': sorted({permission.name for role in user.roles for permission in role.permissions}),
+        'rv': user.role_version
+    }
+
+
+class RoleVersions:
+    # Current role_version per user, so checking a token's claims needs no
+    # query. This process's own changes apply on commit; entries also expire
+    # after ROLE_VERSION_TTL seconds to pick up changes made by other workers.
+    def __init__(self):
+        self._lock = Lock()
+        self._versions = {}
+        self._generation = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+
+        version = db.session.execute(select(User.role_version).where(User.id == user_id)).scalar()
+
+        with self._lock:
+            # Skip storing a version read while it was being changed
+            if self._generation == generation:
+                self._versions[user_id] = (now + current_app.config.get('ROLE_VERSION_TTL', 60), version)
+        return version
+
+    def forget(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._versions.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+
+
+role_versions = RoleVersions()
+
+def current_role_names():
+    # Roles of the authenticated user: from the token while its role version is
+    # current, otherwise (older tokens, roles changed since) from the database
+    claims = get_jwt()
+    user_id = get_jwt_identity()
+    if 'rv' in claims and claims['rv'] == role_versions.get(user_id):
+        return set(claims.get('roles', []))
+
+    user = User.query.options(selectinload(User.roles)).filter_by(id=user_id).first()
+    return {role.name for role in user.roles} if user else set()
+
+
+# Forget cached versions of users whose role_version changed once committed
+def _collect_role_version_changes(changed, session):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+def _collect_bulk_role_version_changes(changed, table, orm_execute_state):
+    if table == 'users' and (orm_execute_state.is_update or orm_execute_state.is_delete):
+        changed.add('*')
+
+def _forget_role_versions(changed):
+    if '*' in changed:
+        role_versions.clear()
+    else:
+        role_versions.forget(*changed)
+
+track_changes('role_version_changes', on_flush=_collect_role_version_changes,
+              on_bulk=_collect_bulk_role_version_changes, on_commit=_forget_role_versions)
@@ -0,0 +1,49 @@
+import random
+import time
+
+from timetable_solver import TimetableSolver
+
+# Synthetic semester: 6 lab rooms and 200 sections, each needing 1.5 or 2 lab
+# hours a week from one of 40 instructors (close to 90% of the room time available)
+ROOMS = 6
+SECTIONS = 200
+INSTRUCTORS = 40
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+def synthetic_demands(days, seed=42):
+    rng = random.Random(seed)
+    demands = []
+    for section_id in range(1, SECTIONS + 1):
+        instructor_id = rng.randint(1, INSTRUCTORS)
+        hours = rng.choice([1.5, 2])
+        demands.append({
+            'course_id': rng.randint(1, 30),
+            'section_id': section_id,
+            'instructor_id': instructor_id,
+            'alternate_instructor_ids': [(instructor_id % INSTRUCTORS) + 1],
+            'hours_per_week': hours,
+            'days': days,
+            'windows': [{'start': '07:30', 'end': '12:00'}, {'start': '13:00', 'end': '19:30'}]
+        })
+    return demands
+
+def run(days, time_budget):
+    rooms = [(room_id, 40) for room_id in range(1, ROOMS + 1)]
+    started = time.monotonic()
+    solver = TimetableSolver(1, synthetic_demands(days), rooms, seed=1)
+    result = solver.solve(time_budget=time_budget)
+    stats = result['stats']
+    print(f"  budget {time_budget:>4}s: {stats['assigned']}/{stats['sessions']} sessions assigned, "
+          f"{stats['preferred_instructor']} with preferred instructor, "
+          f"{stats['iterations']} iterations, {time.monotonic() - started:.2f}s total")
+
+if __name__ == '__main__':
+    print(f"=== Timetable generator benchmark: {ROOMS} rooms, {SECTIONS} sections ===\n")
+    
+    # Monday to Saturday leaves enough room time; Monday to Friday does not, so
+    # the repair phase runs for the whole budget
+    for label, days in [('Monday-Saturday', WEEKDAYS + ['Saturday']), ('Monday-Friday', WEEKDAYS)]:
+        print(label)
+        for budget in [0.5, 2, 5]:
+            run(days, budget)
+        print()
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class TTLCache:
+    # Bounded LRU cache whose entries also expire after ttl seconds. Keys are
+    # tuples starting with a group name (e.g. ('courses',) or ('courses', 'code', 'CS101'))
+    # so all entries built from one table can be invalidated together.
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app, prefix='REFERENCE_CACHE'):
+        self.maxsize = app.config.get(f'{prefix}_MAXSIZE', self.maxsize)
+        self.ttl = app.config.get(f'{prefix}_TTL', self.ttl)
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(key[0], 0))
+
+        value = loader()
+
+        with self._lock:
+            # Skip storing a value loaded while its group was being invalidated
+            if (self._epoch, self._generations.get(key[0], 0)) == generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *groups):
+        with self._lock:
+            for group in groups:
+                self._generations[group] = self._generations.get(group, 0) + 1
+            for key in [key for key in self._entries if key[0] in groups]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+# Reference data (courses, sections, lab rooms, semesters, roles, permissions)
+reference_cache = TTLCache()
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import inspect, select
+
+from cache import TTLCache
+from change_tracking import track_changes
+from extensions import db
+from models import Schedule, Semester, Course, Section, LabRoom, User
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Feed kind in the URL -> Schedule column it filters on
+FEED_KINDS = {
+    'instructor': 'instructor_id',
+    'section': 'section_id',
+    'lab-room': 'lab_room_id',
+}
+
+# Tables whose changes can alter any feed (names, semester dates)
+FEED_TABLES = {'semesters', 'courses', 'sections', 'lab_rooms', 'users'}
+
+# Generated feeds, keyed by ('<kind>:<id>',)
+feed_cache = TTLCache(maxsize=2048, ttl=300)
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['JWT_SECRET_KEY'], salt='calendar-feed')
+
+def feed_token(kind, record_id):
+    # Calendar apps cannot send a bearer token, so feed URLs carry a signed one
+    return _serializer().dumps([kind, record_id])
+
+def verify_feed_token(token, kind, record_id):
+    try:
+        return _serializer().loads(token) == [kind, record_id]
+    except BadSignature:
+        return False
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def _fold(line):
+    # Content lines are folded at 75 octets (RFC 5545, section 3.1)
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts)
+
+def build_feed(kind, record_id):
+    column = getattr(Schedule, FEED_KINDS[kind])
+    rows = db.session.execute(
+        select(
+            Schedule.id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time,
+            Schedule.updated_at, Semester.start_date, Semester.end_date, Course.code,
+            Course.name, Section.program, Section.name, LabRoom.name,
+            User.first_name, User.last_name
+        ).join(Semester, Schedule.semester_id == Semester.id)
+         .join(Course, Schedule.course_id == Course.id)
+         .join(Section, Schedule.section_id == Section.id)
+         .join(LabRoom, Schedule.lab_room_id == LabRoom.id)
+         .join(User, Schedule.instructor_id == User.id)
+         .where(column == record_id, Semester.is_active == True)
+         .order_by(Schedule.id)
+    ).all()
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Lab Class Scheduling System//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+    ]
+    now = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+
+    for (schedule_id, day_of_week, start_time, end_time, updated_at, semester_start, semester_end,
+         course_code, course_name, program, section_name, lab_room_name, first_name, last_name) in rows:
+        if day_of_week not in WEEKDAYS:
+            continue
+
+        # First meeting: the first matching weekday on or after the semester start
+        offset = (WEEKDAYS.index(day_of_week) - semester_start.weekday()) % 7
+        first_day = semester_start + timedelta(days=offset)
+        if first_day > semester_end:
+            continue
+
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:schedule-{schedule_id}@lab-scheduling-system',
+            f"DTSTAMP:{updated_at.strftime('%Y%m%dT%H%M%SZ') if updated_at else now}",
+            f"DTSTART:{datetime.combine(first_day, start_time).strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND:{datetime.combine(first_day, end_time).strftime('%Y%m%dT%H%M%S')}",
+            f"RRULE:FREQ=WEEKLY;UNTIL={semester_end.strftime('%Y%m%d')}T235959",
+            f'SUMMARY:{_escape(f"{course_code} - {program}-{section_name}")}',
+            f'LOCATION:{_escape(lab_room_name)}',
+            f'DESCRIPTION:{_escape(f"{course_name} with {first_name} {last_name}")}',
+            'END:VEVENT',
+        ]
+
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+def get_feed(kind, record_id):
+    return feed_cache.get_or_load((f'{kind}:{record_id}',), lambda: build_feed(kind, record_id))
+
+
+# Invalidate the feeds of every instructor, section and room a committed
+# schedule write touched, before and after the change
+def _collect_feed_changes(keys, session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Schedule):
+            state = inspect(obj)
+            for kind, attribute in FEED_KINDS.items():
+                history = state.attrs[attribute].history
+                for value in list(history.deleted or []) + [getattr(obj, attribute)]:
+                    keys.add(f'{kind}:{value}')
+        elif getattr(obj, '__tablename__', None) in FEED_TABLES:
+            keys.add('*')
+
+def _collect_bulk_feed_changes(keys, table, orm_execute_state):
+    if table in FEED_TABLES | {'schedules'}:
+        keys.add('*')
+
+def _invalidate_feeds(keys):
+    if '*' in keys:
+        feed_cache.clear()
+    else:
+        feed_cache.invalidate(*keys)
+
+track_changes('feed_changes', on_flush=_collect_feed_changes, on_bulk=_collect_bulk_feed_changes,
+              on_commit=_invalidate_feeds)
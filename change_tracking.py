@@ -0,0 +1,54 @@
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# The in-process caches learn about writes through these session events: each
+# subscriber collects what a flush or an ORM bulk statement changed into its
+# own entry of session.info, gets it back once the transaction commits, and
+# loses it on rollback.
+Subscriber = namedtuple('Subscriber', ['key', 'factory', 'on_flush', 'on_bulk', 'on_commit'])
+
+_subscribers = []
+
+def track_changes(key, on_flush=None, on_bulk=None, on_commit=None, factory=set):
+    # on_flush(changes, session) after every flush, on_bulk(changes, table,
+    # orm_execute_state) for every ORM INSERT/UPDATE/DELETE statement, and
+    # on_commit(changes) once committed if anything was collected
+    _subscribers.append(Subscriber(key, factory, on_flush, on_bulk, on_commit))
+
+def pending_changes(session, key):
+    return session.info.get(key)
+
+def _changes(session, subscriber):
+    return session.info.setdefault(subscriber.key, subscriber.factory())
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flush(session, flush_context):
+    for subscriber in _subscribers:
+        if subscriber.on_flush:
+            subscriber.on_flush(_changes(session, subscriber), session)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    table = mapper.persist_selectable.name
+    for subscriber in _subscribers:
+        if subscriber.on_bulk:
+            subscriber.on_bulk(_changes(orm_execute_state.session, subscriber), table, orm_execute_state)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for subscriber in _subscribers:
+        changes = session.info.pop(subscriber.key, None)
+        if changes and subscriber.on_commit:
+            subscriber.on_commit(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    for subscriber in _subscribers:
+        session.info.pop(subscriber.key, None)
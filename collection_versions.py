@@ -0,0 +1,73 @@
+from functools import wraps
+from threading import Lock
+import hashlib
+import time
+import uuid
+
+from flask import current_app, make_response, request
+
+from change_tracking import track_changes
+
+# Distinguishes this process's counters from those of other workers and restarts
+BOOT_ID = uuid.uuid4().hex
+
+
+class CollectionVersions:
+    # Per-table write counters, bumped after every committed write
+    def __init__(self):
+        self._lock = Lock()
+        self._versions = {}
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, table):
+        return self._versions.get(table, 0)
+
+    def etag(self, tables, key=''):
+        # Counters are per process, so tags also roll over every ETAG_TTL seconds
+        # to bound how long a write made by another worker can go unnoticed
+        epoch = int(time.time() // current_app.config.get('ETAG_TTL', 60))
+        versions = '.'.join(str(self.get(table)) for table in tables)
+        return hashlib.sha1(f'{BOOT_ID}:{epoch}:{versions}:{key}'.encode()).hexdigest()
+
+
+collection_versions = CollectionVersions()
+
+def conditional_get(*tables):
+    # Answer If-None-Match with 304 Not Modified while none of the tables the
+    # response is built from have changed, before the view touches the database
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            etag = collection_versions.etag(tables, request.full_path)
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Bump the versions of the tables a transaction wrote (ORM flushes and bulk
+# statements) once committed
+def _collect_changed_tables(tables, session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+
+def _collect_bulk_tables(tables, table, orm_execute_state):
+    tables.add(table)
+
+track_changes('changed_tables', on_flush=_collect_changed_tables, on_bulk=_collect_bulk_tables,
+              on_commit=lambda tables: collection_versions.bump(*tables))
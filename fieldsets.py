@@ -0,0 +1,30 @@
+def parse_fields(args, allowed, nested=None):
+    # ?fields=id,start_time,lab_room.name -> {'id': None, 'start_time': None, 'lab_room': {'name'}}.
+    # A nested set limits the keys of a related record; None means all of them.
+    # nested maps the related record fields to their allowed keys.
+    # Returns None (every field) when the parameter is absent.
+    value = args.get('fields')
+    if value is None:
+        return None
+
+    nested = nested or {}
+    fields = {}
+    for item in value.split(','):
+        name, _, subfield = item.strip().partition('.')
+        if not name:
+            continue
+        if name not in allowed:
+            raise ValueError(f'Unknown field: {name}')
+        if subfield and subfield not in nested.get(name, ()):
+            raise ValueError(f'Unknown field: {name}.{subfield}')
+        if not subfield:
+            fields[name] = None
+        elif fields.get(name, set()) is not None:
+            fields.setdefault(name, set()).add(subfield)
+
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    return fields
+
+def pick(data, fields):
+    return data if fields is None else {key: value for key, value in data.items() if key in fields}
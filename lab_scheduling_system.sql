@@ -24,8 +24,11 @@ CREATE TABLE users (
     first_name VARCHAR(50) NOT NULL,
     last_name VARCHAR(50) NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
+    role_version INT NOT NULL DEFAULT 1,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX ix_users_last_first (last_name, first_name),
+    INDEX ix_users_first_name (first_name)
 );
 
 -- Create roles table
@@ -118,7 +121,45 @@ CREATE TABLE schedules (
     FOREIGN KEY (section_id) REFERENCES sections(id) ON DELETE CASCADE,
     FOREIGN KEY (lab_room_id) REFERENCES lab_rooms(id) ON DELETE CASCADE,
     FOREIGN KEY (instructor_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX ix_schedules_room_slot (semester_id, day_of_week, lab_room_id, start_time),
+    INDEX ix_schedules_section_slot (semester_id, day_of_week, section_id, start_time),
+    INDEX ix_schedules_instructor_slot (semester_id, day_of_week, instructor_id, start_time),
+    INDEX ix_schedules_updated (updated_at, id)
+);
+
+-- Create schedule deletion log (tombstones for delta sync)
+CREATE TABLE schedule_deletions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    schedule_id INT NOT NULL,
+    semester_id INT NOT NULL,
+    deleted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (semester_id) REFERENCES semesters(id) ON DELETE CASCADE,
+    INDEX ix_schedule_deletions_deleted (deleted_at, id)
+);
+
+-- Create user import table (background POST /api/users/bulk uploads)
+CREATE TABLE user_imports (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    created_by INT,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    total INT NOT NULL,
+    created INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    results LONGTEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- Create schedule lock table (per semester, day, room/section/instructor write locks)
+CREATE TABLE schedule_locks (
+    semester_id INT NOT NULL,
+    day_of_week VARCHAR(10) NOT NULL,
+    dimension VARCHAR(20) NOT NULL,
+    key_id INT NOT NULL,
+    locked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (semester_id, day_of_week, dimension, key_id)
 );
 
 -- Create notifications table
@@ -129,7 +170,8 @@ CREATE TABLE notifications (
     message TEXT NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX ix_notifications_user_created (user_id, created_at, id)
 );
 
 -- Insert permissions
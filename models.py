@@ -1,6 +1,11 @@
 from extensions import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only, raiseload
+
+from fieldsets import pick
+from password_hashing import password_hasher
 
 # Association table for user roles
 user_roles = db.Table('user_roles',
@@ -10,6 +15,12 @@ user_roles = db.Table('user_roles',
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Prefix search on names (GET /api/users/search); email and student_id
+        # are covered by their unique indexes
+        db.Index('ix_users_last_first', 'last_name', 'first_name'),
+        db.Index('ix_users_first_name', 'first_name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(20), unique=True)
@@ -19,6 +30,9 @@ class User(db.Model):
     last_name = db.Column(db.String(50), nullable=False)
     classification = db.Column(db.String(50), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Bumped whenever the user's roles or active flag change, retiring the role
+    # claims of tokens issued before
+    role_version = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -33,30 +47,88 @@ class User(db.Model):
     
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def has_role(self, role_name):
         return any(role.name == role_name for role in self.roles)
     
-    def to_dict(self):
+    # Fields to_dict() can return, for ?fields=
+    FIELDS = ('id', 'student_id', 'email', 'first_name', 'last_name', 'full_name', 'classification',
+              'roles', 'permissions', 'is_active', 'created_at', 'updated_at', 'has_profile_pic')
+    
+    @staticmethod
+    def detail_options():
+        # Load everything to_dict() touches up front; the profile picture blob is
+        # left out since only its presence is reported
+        return [
+            selectinload(User.roles).selectinload(Role.permissions),
+            selectinload(User.profile_pic).load_only(ProfilePic.profile_id, ProfilePic.id),
+        ]
+    
+    @staticmethod
+    def column_options(fields):
+        # load_only() of the plain columns behind the requested fields
+        columns = {'full_name': ['first_name', 'last_name'], 'roles': [], 'permissions': [], 'has_profile_pic': []}
+        return load_only(User.id, *[getattr(User, column) for name in (User.FIELDS if fields is None else fields)
+                                    if name in User.FIELDS for column in columns.get(name, [name])])
+    
+    @staticmethod
+    def summary_options(fields=None):
+        # Columns only; to_summary_dict() gets roles and the profile picture flag passed in
+        return [User.column_options(fields), raiseload('*')]
+    
+    @staticmethod
+    def field_options(fields):
+        # Load only the columns and relationships the requested fields need
+        if fields is None:
+            return User.detail_options()
+        
+        options = [User.column_options(fields)]
+        if 'permissions' in fields:
+            options.append(selectinload(User.roles).selectinload(Role.permissions).load_only(Permission.name))
+        elif 'roles' in fields:
+            options.append(selectinload(User.roles).load_only(Role.name))
+        if 'has_profile_pic' in fields:
+            options.append(selectinload(User.profile_pic).load_only(ProfilePic.profile_id, ProfilePic.id))
+        options.append(raiseload('*'))
+        return options
+    
+    def _column_serializers(self):
         return {
-            'id': self.id,
-            'student_id': self.student_id,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'full_name': f"{self.first_name} {self.last_name}",
-            'classification': self.classification,
-            'roles': [role.name for role in self.roles],
-            'permissions': [permission.name for role in self.roles for permission in role.permissions],
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'has_profile_pic': True if self.profile_pic else False
+            'id': lambda: self.id,
+            'student_id': lambda: self.student_id,
+            'email': lambda: self.email,
+            'first_name': lambda: self.first_name,
+            'last_name': lambda: self.last_name,
+            'full_name': lambda: f"{self.first_name} {self.last_name}",
+            'classification': lambda: self.classification,
+            'is_active': lambda: self.is_active,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None
         }
+    
+    def to_dict(self, fields=None):
+        serializers = self._column_serializers()
+        serializers.update({
+            'roles': lambda: [role.name for role in self.roles],
+            'permissions': lambda: [permission.name for role in self.roles for permission in role.permissions],
+            'has_profile_pic': lambda: True if self.profile_pic else False
+        })
+        return {name: serialize() for name, serialize in serializers.items() if fields is None or name in fields}
+    
+    def to_summary_dict(self, role_ids, roles, has_profile_pic, fields=None):
+        # Same output as to_dict() without touching relationships: role_ids are
+        # this user's roles and roles maps role id -> (name, permission names)
+        serializers = self._column_serializers()
+        serializers.update({
+            'roles': lambda: [roles[role_id][0] for role_id in role_ids],
+            'permissions': lambda: [name for role_id in role_ids for name in roles[role_id][1]],
+            'has_profile_pic': lambda: has_profile_pic
+        })
+        return {name: serialize() for name, serialize in serializers.items() if fields is None or name in fields}
 
 class Role(db.Model):
     __tablename__ = 'roles'
@@ -96,6 +168,27 @@ class Permission(db.Model):
             'description': self.description
         }
 
+# Tokens carry role claims: changing a user's roles or active flag retires them
+@event.listens_for(Session, 'before_flush')
+def _bump_role_versions(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if state.attrs.roles.history.has_changes() or state.attrs.is_active.history.has_changes():
+                obj.role_version = (obj.role_version or 0) + 1
+    
+    # A role's permissions changed: every holder's claims are out of date
+    role_ids = [obj.id for obj in session.dirty
+                if isinstance(obj, Role) and inspect(obj).attrs.permissions.history.has_changes()]
+    if role_ids:
+        with session.no_autoflush:
+            session.execute(
+                update(User)
+                .where(User.id.in_(select(user_roles.c.user_id).where(user_roles.c.role_id.in_(role_ids))))
+                .values(role_version=User.role_version + 1),
+                execution_options={'synchronize_session': False}
+            )
+
 class Semester(db.Model):
     __tablename__ = 'semesters'
     
@@ -111,6 +204,9 @@ class Semester(db.Model):
     # Relationships
     schedules = db.relationship('Schedule', backref='semester', lazy='dynamic')
     
+    # Keys of to_dict(), for nested ?fields= on schedules
+    FIELDS = ('id', 'name', 'school_year', 'start_date', 'end_date', 'is_active', 'created_at', 'updated_at')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -135,6 +231,9 @@ class LabRoom(db.Model):
     # Relationships
     schedules = db.relationship('Schedule', backref='lab_room', lazy='dynamic')
     
+    # Keys of to_dict(), for nested ?fields= on schedules
+    FIELDS = ('id', 'name', 'capacity', 'description', 'is_active')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -156,6 +255,9 @@ class Course(db.Model):
     # Relationships
     schedules = db.relationship('Schedule', backref='course', lazy='dynamic')
     
+    # Keys of to_dict(), for nested ?fields= on schedules
+    FIELDS = ('id', 'code', 'name', 'description', 'units')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -176,6 +278,9 @@ class Section(db.Model):
     # Relationships
     schedules = db.relationship('Schedule', backref='section', lazy='dynamic')
     
+    # Keys of to_dict(), for nested ?fields= on schedules
+    FIELDS = ('id', 'name', 'program', 'year_level', 'full_name')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -187,6 +292,14 @@ class Section(db.Model):
 
 class Schedule(db.Model):
     __tablename__ = 'schedules'
+    __table_args__ = (
+        # Composite indexes for the room, section and instructor conflict checks
+        db.Index('ix_schedules_room_slot', 'semester_id', 'day_of_week', 'lab_room_id', 'start_time'),
+        db.Index('ix_schedules_section_slot', 'semester_id', 'day_of_week', 'section_id', 'start_time'),
+        db.Index('ix_schedules_instructor_slot', 'semester_id', 'day_of_week', 'instructor_id', 'start_time'),
+        # Delta sync (GET /api/schedules/changes)
+        db.Index('ix_schedules_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     semester_id = db.Column(db.Integer, db.ForeignKey('semesters.id'), nullable=False)
@@ -206,25 +319,181 @@ class Schedule(db.Model):
     instructor = db.relationship('User', foreign_keys=[instructor_id])
     creator = db.relationship('User', foreign_keys=[created_by])
     
-    def to_dict(self):
+    # Fields to_dict() can return, for ?fields=
+    FIELDS = ('id', 'semester', 'course', 'section', 'lab_room', 'instructor', 'day_of_week',
+              'start_time', 'end_time', 'is_lab', 'created_by', 'created_at', 'updated_at')
+    
+    # Nested fields -> (foreign key column, relationship)
+    RELATED_FIELDS = {
+        'semester': ('semester_id', 'semester'),
+        'course': ('course_id', 'course'),
+        'section': ('section_id', 'section'),
+        'lab_room': ('lab_room_id', 'lab_room'),
+        'instructor': ('instructor_id', 'instructor'),
+        'created_by': ('created_by', 'creator'),
+    }
+    
+    # Keys each nested record can be limited to
+    NESTED_FIELDS = {
+        'semester': Semester.FIELDS,
+        'course': Course.FIELDS,
+        'section': Section.FIELDS,
+        'lab_room': LabRoom.FIELDS,
+        'instructor': User.FIELDS,
+        'created_by': User.FIELDS,
+    }
+    
+    @staticmethod
+    def detail_options():
+        # Load everything to_dict() touches up front, in a fixed number of queries
+        return [
+            joinedload(Schedule.semester),
+            joinedload(Schedule.course),
+            joinedload(Schedule.section),
+            joinedload(Schedule.lab_room),
+            selectinload(Schedule.instructor).options(*User.detail_options()),
+            selectinload(Schedule.creator).options(*User.detail_options()),
+        ]
+    
+    @staticmethod
+    def field_options(fields):
+        # Load only the columns and relationships the requested fields need;
+        # anything else raises instead of lazy loading
+        if fields is None:
+            return Schedule.detail_options()
+        
+        options = [load_only(Schedule.id, *[
+            getattr(Schedule, Schedule.RELATED_FIELDS[name][0] if name in Schedule.RELATED_FIELDS else name)
+            for name in fields
+        ])]
+        for name, (_, relationship) in Schedule.RELATED_FIELDS.items():
+            if name not in fields:
+                continue
+            if relationship in ('instructor', 'creator'):
+                options.append(selectinload(getattr(Schedule, relationship)).options(*User.field_options(fields[name])))
+            else:
+                options.append(joinedload(getattr(Schedule, relationship)))
+        options.append(raiseload('*'))
+        return options
+    
+    def to_dict(self, fields=None):
+        # fields: as returned by fieldsets.parse_fields(); None returns everything
+        def related(name):
+            record = getattr(self, Schedule.RELATED_FIELDS[name][1])
+            subfields = fields.get(name) if fields else None
+            if record is None:
+                return None
+            if isinstance(record, User):
+                return record.to_dict(subfields)
+            return pick(record.to_dict(), subfields)
+        
+        serializers = {
+            'id': lambda: self.id,
+            'semester': lambda: related('semester'),
+            'course': lambda: related('course'),
+            'section': lambda: related('section'),
+            'lab_room': lambda: related('lab_room'),
+            'instructor': lambda: related('instructor'),
+            'day_of_week': lambda: self.day_of_week,
+            'start_time': lambda: self.start_time.strftime('%H:%M') if self.start_time else None,
+            'end_time': lambda: self.end_time.strftime('%H:%M') if self.end_time else None,
+            'is_lab': lambda: self.is_lab,
+            'created_by': lambda: related('created_by'),
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None
+        }
+        return {name: serialize() for name, serialize in serializers.items() if fields is None or name in fields}
+    
+    def to_row_dict(self):
+        # Flat representation referencing related records by id
         return {
             'id': self.id,
-            'semester': self.semester.to_dict() if self.semester else None,
-            'course': self.course.to_dict() if self.course else None,
-            'section': self.section.to_dict() if self.section else None,
-            'lab_room': self.lab_room.to_dict() if self.lab_room else None,
-            'instructor': self.instructor.to_dict() if self.instructor else None,
+            'semester_id': self.semester_id,
+            'course_id': self.course_id,
+            'section_id': self.section_id,
+            'lab_room_id': self.lab_room_id,
+            'instructor_id': self.instructor_id,
             'day_of_week': self.day_of_week,
             'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
             'is_lab': self.is_lab,
-            'created_by': self.creator.to_dict() if self.creator else None,
+            'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class ScheduleDeletion(db.Model):
+    # Tombstones of deleted schedules, so delta sync clients can drop them
+    __tablename__ = 'schedule_deletions'
+    __table_args__ = (
+        db.Index('ix_schedule_deletions_deleted', 'deleted_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, nullable=False)
+    semester_id = db.Column(db.Integer, db.ForeignKey('semesters.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.schedule_id,
+            'semester_id': self.semester_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+# Log every ORM delete of a schedule in the same flush; bulk DELETE statements
+# bypass this and write their tombstones themselves
+@event.listens_for(Session, 'before_flush')
+def _log_schedule_deletions(session, flush_context, instances):
+    for obj in session.deleted:
+        if isinstance(obj, Schedule):
+            session.add(ScheduleDeletion(schedule_id=obj.id, semester_id=obj.semester_id))
+
+class UserImport(db.Model):
+    # Progress and per-row report of a POST /api/users/bulk upload processed in the background
+    __tablename__ = 'user_imports'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    total = db.Column(db.Integer, nullable=False)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    results = db.Column(db.Text(4294967295), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self, include_results=True):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'created': self.created,
+            'failed': self.failed,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if include_results:
+            data['results'] = json.loads(self.results) if self.results else []
+        return data
+
+class ScheduleLock(db.Model):
+    # One row per (semester, day, conflict dimension, key id); schedule writes
+    # lock the rows of every slot they touch before checking for conflicts
+    __tablename__ = 'schedule_locks'
+    
+    semester_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day_of_week = db.Column(db.String(10), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    key_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Keyset pagination of a user's notifications, newest first
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,36 @@
+# Day occupancy as bitmaps: bit i set means the 15-minute slot starting at
+# i * SLOT_MINUTES after midnight is taken
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+def minutes_of(value):
+    return value.hour * 60 + value.minute
+
+def interval_mask(start_minutes, end_minutes):
+    # Slots touched by [start, end): partially used slots count as taken
+    first = start_minutes // SLOT_MINUTES
+    last = -(-end_minutes // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first
+
+def free_windows(occupied, duration_minutes, window_start, window_end):
+    # Maximal free runs inside [window_start, window_end) (minutes) lasting at
+    # least duration_minutes, as (start, end) minute pairs
+    first = -(-window_start // SLOT_MINUTES)
+    last = window_end // SLOT_MINUTES
+    if last <= first:
+        return []
+
+    free = ~occupied & (((1 << (last - first)) - 1) << first)
+    needed = -(-duration_minutes // SLOT_MINUTES)
+
+    windows = []
+    while free:
+        # Lowest run of set bits: its first bit, and the first clear bit above it
+        low = free & -free
+        above = (free + low) & ~free
+        start = low.bit_length() - 1
+        end = above.bit_length() - 1
+        if end - start >= needed:
+            windows.append((start * SLOT_MINUTES, end * SLOT_MINUTES))
+        free &= ~(above - low)
+    return windows
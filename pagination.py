@@ -0,0 +1,77 @@
+from datetime import datetime
+import base64
+import json
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+def wants_page(args):
+    # Pagination is opt-in so existing clients keep getting plain lists
+    return 'limit' in args or 'cursor' in args
+
+def parse_limit(args, default_limit=None, max_limit=None):
+    # Page size settings unless the endpoint has its own
+    if default_limit is None:
+        default_limit = current_app.config.get('PAGE_SIZE_DEFAULT', 50)
+    if max_limit is None:
+        max_limit = current_app.config.get('PAGE_SIZE_MAX', 500)
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, max_limit)
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        expected = column.type.python_type
+        if expected is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (ValueError, TypeError):
+                raise ValueError('Invalid cursor')
+        elif isinstance(value, bool) and expected is not bool or not isinstance(value, expected):
+            raise ValueError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+def after_cursor(columns, values, descending=False):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which every
+    # backend can match against an index on the ordering columns
+    clauses = []
+    for index, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*[previous == seen for previous, seen in zip(columns[:index], values[:index])], beyond))
+    return or_(*clauses)
+
+def keyset_page(query, columns, args, descending=False):
+    # Return one page of query ordered by columns (the last one must be unique)
+    # and the cursor of the next page, or None on the last page
+    limit = parse_limit(args)
+    cursor = args.get('cursor')
+
+    if cursor:
+        query = query.filter(after_cursor(columns, decode_cursor(cursor, columns), descending))
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    items = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+    return items, next_cursor
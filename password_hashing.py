@@ -0,0 +1,113 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import time
+
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHashBusy(Exception):
+    pass
+
+def busy_response():
+    return jsonify({'error': 'Too many password requests, please try again shortly'}), 503, {'Retry-After': '1'}
+
+
+class PasswordHasher:
+    # Hashes and verifies passwords on a fixed number of threads, so a burst of
+    # logins cannot tie up every request worker with deliberately slow hashing.
+    # hashlib releases the GIL while hashing, so the threads run in parallel.
+    # Requests arriving while max_queue others are already waiting are refused.
+    def __init__(self, workers=4, max_queue=64, method='pbkdf2'):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.method = method
+        self._lock = Lock()
+        self._executor = None
+        self._prefix = None
+        self._queued = 0
+        self._running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    def init_app(self, app):
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_queue = app.config.get('PASSWORD_HASH_MAX_QUEUE', self.max_queue)
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+
+    def _submit(self, function, *args, bounded=True):
+        with self._lock:
+            if bounded and self._queued >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHashBusy()
+            self._queued += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+            if self._executor is None:
+                # Created on first use, so each forked worker process gets its own threads
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            executor = self._executor
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_seconds += started - submitted
+            try:
+                return function(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self._hash_seconds += time.monotonic() - started
+
+        return executor.submit(task)
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, password_hash, password):
+        return self._submit(check_password_hash, password_hash, password).result()
+
+    def hash_many(self, passwords):
+        # Hashes on all but one worker thread at once and keeps no more than
+        # that in flight, so logins arriving meanwhile always find a free thread
+        threads = max(1, self.workers - 1)
+        hashes = []
+        in_flight = deque()
+        for password in passwords:
+            if len(in_flight) >= threads:
+                hashes.append(in_flight.popleft().result())
+            in_flight.append(self._submit(generate_password_hash, password, self.method, bounded=False))
+        hashes.extend(future.result() for future in in_flight)
+        return hashes
+
+    def needs_rehash(self, password_hash):
+        # Compare the method part of the stored hash ('pbkdf2:sha256:600000$salt$hash')
+        # with what the configured method produces, defaults included
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'method': self.method,
+                'queued': self._queued,
+                'running': self._running,
+                'peak_queued': self.peak_queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self._wait_seconds / self.completed * 1000, 1) if self.completed else None,
+                'avg_hash_ms': round(self._hash_seconds / self.completed * 1000, 1) if self.completed else None
+            }
+
+
+password_hasher = PasswordHasher()
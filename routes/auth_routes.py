@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from models import User, Role
+from sqlalchemy import update
 from extensions import db
+from auth_claims import role_claims
+from password_hashing import password_hasher, PasswordHashBusy, busy_response
 from email_validator import validate_email, EmailNotValidError
 import re
 from functools import wraps
@@ -68,7 +71,10 @@ def register():
         first_name=data['first_name'],
         last_name=data['last_name']
     )
-    new_user.password = data['password']  # This will hash the password
+    try:
+        new_user.password = data['password']  # This will hash the password
+    except PasswordHashBusy:
+        return busy_response()
     
     # Assign default role (Student)
     student_role = Role.query.filter_by(name='Student').first()
@@ -83,7 +89,7 @@ def register():
     db.session.commit()
     
     # Generate tokens
-    access_token = create_access_token(identity=new_user.id)
+    access_token = create_access_token(identity=new_user.id, additional_claims=role_claims(new_user))
     refresh_token = create_refresh_token(identity=new_user.id)
     
     return jsonify({
@@ -109,20 +115,36 @@ def login():
     
     # Find user by email or student ID
     if is_email:
-        user = User.query.filter_by(email=id_or_email).first()
+        user = User.query.options(*User.detail_options()).filter_by(email=id_or_email).first()
     else:
-        user = User.query.filter_by(student_id=id_or_email).first()
+        user = User.query.options(*User.detail_options()).filter_by(student_id=id_or_email).first()
     
     # Check if user exists and password is correct
-    if not user or not user.verify_password(password):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    try:
+        if not user or not user.verify_password(password):
+            return jsonify({'error': 'Invalid credentials'}), 401
+    except PasswordHashBusy:
+        return busy_response()
     
     # Check if user is active
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated. Please contact administrator.'}), 403
     
-    # Generate tokens
-    access_token = create_access_token(identity=user.id)
+    # Upgrade a hash made with older PASSWORD_HASH_METHOD settings while the
+    # password is at hand; a table-level update leaves the caches built from
+    # user records alone, since only the hash changes
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            db.session.execute(
+                update(User.__table__).where(User.__table__.c.id == user.id)
+                .values(password_hash=password_hasher.hash(password))
+            )
+            db.session.commit()
+        except PasswordHashBusy:
+            pass
+    
+    # Generate tokens; the access token carries the user's roles and permissions
+    access_token = create_access_token(identity=user.id, additional_claims=role_claims(user))
     refresh_token = create_refresh_token(identity=user.id)
     
     return jsonify({
@@ -136,7 +158,7 @@ def login():
 @jwt_refresh_required_custom
 def refresh():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = User.query.options(*User.detail_options()).filter_by(id=current_user_id).first()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -144,7 +166,8 @@ def refresh():
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated'}), 403
     
-    access_token = create_access_token(identity=current_user_id)
+    # Fresh claims pick up any role changes since the last token
+    access_token = create_access_token(identity=current_user_id, additional_claims=role_claims(user))
     
     return jsonify({
         'access_token': access_token,
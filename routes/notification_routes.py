@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from models import User, Notification
 from extensions import db
+from pagination import wants_page, keyset_page
 from functools import wraps
 
 notification_bp = Blueprint('notifications', __name__)
@@ -34,6 +35,20 @@ def get_user_notifications():
         is_read_bool = is_read.lower() == 'true'
         query = query.filter_by(is_read=is_read_bool)
     
+    # Execute query one page at a time (newest first) if limit or cursor is given
+    if wants_page(request.args):
+        try:
+            notifications, next_cursor = keyset_page(
+                query, [Notification.created_at, Notification.id], request.args, descending=True
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'notifications': [notification.to_dict() for notification in notifications],
+            'next_cursor': next_cursor
+        }), 200
+    
     # Order by created_at (newest first)
     query = query.order_by(Notification.created_at.desc())
     
@@ -1,22 +1,43 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from models import User, Schedule, Semester, Course, Section, LabRoom, Notification
+from models import User, Schedule, ScheduleDeletion, Semester, Course, Section, LabRoom, Notification
 from extensions import db
-from datetime import datetime, time
+from schedule_index import schedule_index, find_conflicting_schedule, query_conflict, query_conflict_pairs, load_buckets, make_slot, room_masks
+from schedule_locks import lock_keys, lock_slots
+from pagination import wants_page, keyset_page
+from fieldsets import parse_fields
+from auth_claims import current_role_names
+from timetable_solver import TimetableSolver, DEFAULT_DAYS, WEEKDAYS, to_minutes
+from occupancy import free_windows
+from utilization import utilization_report
+from collection_versions import conditional_get
+from cache import reference_cache
+from calendar_feeds import FEED_KINDS, feed_token, verify_feed_token, get_feed
+from timetable_grids import GRID_KINDS, timetable_grids
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from datetime import datetime, time, timedelta, timezone
+from collections import Counter
 from functools import wraps
+import csv
+import hashlib
+import io
+import json
 
 schedule_bp = Blueprint('schedules', __name__)
 
+# Tables a full schedule serialization (Schedule.to_dict) is built from
+SCHEDULE_TABLES = ('schedules', 'semesters', 'courses', 'sections', 'lab_rooms',
+                   'users', 'roles', 'permissions', 'profile_pic')
+
 # Custom decorator to check if user has scheduling permissions
 def scheduling_permission_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
             verify_jwt_in_request()
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
             
-            if not user or not (user.has_role('Academic Coordinator') or user.has_role('System Administrator')):
+            # Checked against the token's role claims, without a query
+            if not current_role_names() & {'Academic Coordinator', 'System Administrator'}:
                 return jsonify({'error': 'Scheduling permission required'}), 403
             
             return fn(*args, **kwargs)
@@ -37,14 +58,40 @@ def jwt_required_custom(fn):
     
     return wrapper
 
+def normalize_schedules(schedules):
+    # Load each referenced record once, with one query per lookup table
+    def lookup(model, ids, options=()):
+        if not ids:
+            return {}
+        records = model.query.options(*options).filter(model.id.in_(ids)).all()
+        return {record.id: record.to_dict() for record in records}
+    
+    user_ids = {s.instructor_id for s in schedules} | {s.created_by for s in schedules}
+    
+    return {
+        'schedules': [schedule.to_row_dict() for schedule in schedules],
+        'semesters': lookup(Semester, {s.semester_id for s in schedules}),
+        'courses': lookup(Course, {s.course_id for s in schedules}),
+        'sections': lookup(Section, {s.section_id for s in schedules}),
+        'lab_rooms': lookup(LabRoom, {s.lab_room_id for s in schedules}),
+        'users': lookup(User, user_ids, User.detail_options())
+    }
+
 @schedule_bp.route('/', methods=['GET'])
 @jwt_required_custom
+@conditional_get(*SCHEDULE_TABLES)
 def get_all_schedules():
     # Get query parameters
     semester_id = request.args.get('semester_id')
     day_of_week = request.args.get('day_of_week')
     section_id = request.args.get('section_id')
     lab_room_id = request.args.get('lab_room_id')
+    normalized = request.args.get('shape') == 'normalized'
+    
+    try:
+        fields = parse_fields(request.args, Schedule.FIELDS, Schedule.NESTED_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Start with base query
     query = Schedule.query
@@ -53,7 +100,7 @@ def get_all_schedules():
     if semester_id:
         # Handle the 'new' special case
         if semester_id == 'new':
-            return jsonify([]), 200
+            return jsonify(normalize_schedules([]) if normalized else []), 200
         query = query.filter_by(semester_id=semester_id)
     
     if day_of_week:
@@ -65,20 +112,304 @@ def get_all_schedules():
     if lab_room_id:
         query = query.filter_by(lab_room_id=lab_room_id)
     
-    # Execute query
-    schedules = query.all()
+    if not normalized:
+        # Load related records eagerly for to_dict(), limited to the requested fields
+        query = query.options(*Schedule.field_options(fields))
+    
+    # Execute query, one page at a time if limit or cursor is given
+    if wants_page(request.args):
+        try:
+            schedules, next_cursor = keyset_page(query, [Schedule.id], request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        schedules, next_cursor = query.all(), None
+    
+    # Normalized shape: rows with foreign-key ids plus de-duplicated lookup tables
+    if normalized:
+        response = normalize_schedules(schedules)
+    else:
+        response = [schedule.to_dict(fields) for schedule in schedules]
+    
+    if wants_page(request.args):
+        if not normalized:
+            response = {'schedules': response}
+        response['next_cursor'] = next_cursor
+    
+    return jsonify(response), 200
+
+@schedule_bp.route('/availability', methods=['GET'])
+@jwt_required_custom
+@conditional_get('schedules', 'lab_rooms')
+def get_availability():
+    # Get query parameters
+    semester_id = request.args.get('semester_id')
+    day_of_week = request.args.get('day_of_week')
+    
+    if not semester_id or not day_of_week:
+        return jsonify({'error': 'semester_id and day_of_week are required'}), 400
+    
+    try:
+        semester_id = int(semester_id)
+        duration = int(request.args.get('duration', 60))
+        window_start = datetime.strptime(request.args.get('start', '07:00'), '%H:%M')
+        window_end = datetime.strptime(request.args.get('end', '21:00'), '%H:%M')
+    except ValueError:
+        return jsonify({'error': 'Invalid semester_id, duration or time format. Use HH:MM format.'}), 400
+    
+    if duration <= 0:
+        return jsonify({'error': 'Duration must be a positive number of minutes'}), 400
+    
+    # Free windows come straight from the per-room occupancy bitmaps of the
+    # conflict index, which are kept up to date on every write (or of a fresh
+    # query when SCHEDULE_INDEX_ENABLED is off)
+    lab_rooms = db.session.query(LabRoom.id, LabRoom.name).filter_by(is_active=True).order_by(LabRoom.id).all()
+    masks = room_masks(semester_id, day_of_week, [lab_room.id for lab_room in lab_rooms])
+    
+    available = []
+    for lab_room in lab_rooms:
+        windows = free_windows(masks[lab_room.id], duration,
+                               window_start.hour * 60 + window_start.minute,
+                               window_end.hour * 60 + window_end.minute)
+        for start, end in windows:
+            available.append({
+                'lab_room_id': lab_room.id,
+                'lab_room_name': lab_room.name,
+                'day_of_week': day_of_week,
+                'start_time': f'{start // 60:02d}:{start % 60:02d}',
+                'end_time': f'{end // 60:02d}:{end % 60:02d}'
+            })
+    
+    return jsonify(available), 200
+
+@schedule_bp.route('/analytics/utilization', methods=['GET'])
+@jwt_required_custom
+@conditional_get('schedules', 'semesters', 'lab_rooms')
+def get_room_utilization():
+    # Get query parameters; without semester_id the whole history is analysed
+    semester_id = request.args.get('semester_id')
+    days = request.args.get('days', 'Monday,Tuesday,Wednesday,Thursday,Friday,Saturday').split(',')
+    
+    try:
+        window_start = datetime.strptime(request.args.get('start', '07:00'), '%H:%M')
+        window_end = datetime.strptime(request.args.get('end', '21:00'), '%H:%M')
+    except ValueError:
+        return jsonify({'error': 'Invalid time format. Use HH:MM format.'}), 400
+    
+    window_start = window_start.hour * 60 + window_start.minute
+    window_end = window_end.hour * 60 + window_end.minute
+    if window_start >= window_end:
+        return jsonify({'error': 'Start time must be before end time'}), 400
+    
+    semesters = db.session.query(Semester.id)
+    if semester_id:
+        semesters = semesters.filter(Semester.id == semester_id)
+    semester_ids = [row.id for row in semesters.order_by(Semester.id).all()]
+    if not semester_ids:
+        return jsonify({'error': 'Semester not found'}), 404
+    
+    # One column-only query for the schedules, no ORM objects
+    rows = db.session.query(
+        Schedule.semester_id, Schedule.lab_room_id, Schedule.day_of_week,
+        Schedule.start_time, Schedule.end_time
+    )
+    if semester_id:
+        rows = rows.filter(Schedule.semester_id == semester_id)
+    
+    lab_rooms = db.session.query(LabRoom.id, LabRoom.name).order_by(LabRoom.id).all()
+    
+    report = utilization_report(rows.all(), semester_ids, [tuple(room) for room in lab_rooms],
+                                days, window_start, window_end)
+    report['semester_ids'] = semester_ids
+    
+    return jsonify(report), 200
+
+# Columns of a schedule export, in order
+EXPORT_COLUMNS = ['id', 'semester_id', 'day_of_week', 'start_time', 'end_time', 'is_lab',
+                  'course_id', 'course_code', 'section_id', 'section', 'lab_room_id', 'lab_room',
+                  'instructor_id', 'instructor', 'updated_at']
+
+@schedule_bp.route('/export', methods=['GET'])
+@jwt_required_custom
+def export_schedules():
+    semester_id = request.args.get('semester_id')
+    export_format = request.args.get('format', 'ndjson')
+    
+    if not semester_id:
+        return jsonify({'error': 'semester_id is required'}), 400
+    
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    # Plain column rows (no ORM objects) read through a server-side cursor in
+    # batches, so memory stays flat however large the semester is
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    statement = select(
+        Schedule.id, Schedule.semester_id, Schedule.day_of_week, Schedule.start_time,
+        Schedule.end_time, Schedule.is_lab, Schedule.course_id, Course.code,
+        Schedule.section_id, Section.program, Section.name, Schedule.lab_room_id,
+        LabRoom.name, Schedule.instructor_id, User.first_name, User.last_name, Schedule.updated_at
+    ).join(Course, Schedule.course_id == Course.id) \
+     .join(Section, Schedule.section_id == Section.id) \
+     .join(LabRoom, Schedule.lab_room_id == LabRoom.id) \
+     .join(User, Schedule.instructor_id == User.id) \
+     .where(Schedule.semester_id == semester_id) \
+     .order_by(Schedule.id) \
+     .execution_options(stream_results=True, yield_per=batch_size)
+    
+    def export_row(row):
+        (schedule_id, row_semester_id, day_of_week, start_time, end_time, is_lab, course_id,
+         course_code, section_id, program, section_name, lab_room_id, lab_room_name,
+         instructor_id, first_name, last_name, updated_at) = row
+        return [schedule_id, row_semester_id, day_of_week, start_time.strftime('%H:%M'),
+                end_time.strftime('%H:%M'), is_lab, course_id, course_code, section_id,
+                f"{program}-{section_name}", lab_room_id, lab_room_name, instructor_id,
+                f"{first_name} {last_name}", updated_at.isoformat() if updated_at else None]
+    
+    def generate():
+        result = db.session.execute(statement)
+        
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        
+        for batch in result.partitions():
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(export_row(row) for row in batch)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, export_row(row)))) + '\n'
+                              for row in batch)
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=schedules-{semester_id}.{export_format}'
+    return response
+
+@schedule_bp.route('/changes', methods=['GET'])
+@jwt_required_custom
+def get_schedule_changes():
+    # Delta sync: schedules created or updated after the since watermark, plus
+    # tombstones of deleted ones. Without since, every schedule is returned.
+    semester_id = request.args.get('semester_id')
+    since = request.args.get('since')
+    
+    if since:
+        try:
+            since = datetime.fromisoformat(since.replace('Z', '+00:00'))
+        except ValueError:
+            return jsonify({'error': 'Invalid since timestamp. Use the watermark of the previous response.'}), 400
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    # Taken before reading, so changes committed meanwhile fall into the next fetch
+    watermark = datetime.utcnow()
+    
+    upserts = Schedule.query
+    deletions = ScheduleDeletion.query
+    if semester_id:
+        upserts = upserts.filter(Schedule.semester_id == semester_id)
+        deletions = deletions.filter(ScheduleDeletion.semester_id == semester_id)
+    
+    if since:
+        # Re-read a short overlap so writes committed after their updated_at was
+        # stamped (and second-precision timestamps) are not missed; clients apply
+        # upserts and tombstones by id, so repeats are harmless
+        after = since - timedelta(seconds=current_app.config.get('SCHEDULE_CHANGES_OVERLAP', 5))
+        upserts = upserts.filter(Schedule.updated_at > after)
+        deletions = deletions.filter(ScheduleDeletion.deleted_at > after)
+        deleted = [deletion.to_dict() for deletion in deletions.order_by(ScheduleDeletion.deleted_at, ScheduleDeletion.id)]
+    else:
+        deleted = []
+    
+    return jsonify({
+        'since': since.isoformat() if since else None,
+        'watermark': watermark.isoformat(),
+        'upserts': [schedule.to_row_dict() for schedule in upserts.order_by(Schedule.updated_at, Schedule.id)],
+        'deletions': deleted
+    }), 200
+
+@schedule_bp.route('/calendar/<kind>/<int:record_id>/link', methods=['GET'])
+@jwt_required_custom
+def get_calendar_link(kind, record_id):
+    if kind not in FEED_KINDS:
+        return jsonify({'error': 'Calendar kind must be instructor, section or lab-room'}), 404
+    
+    token = feed_token(kind, record_id)
+    return jsonify({
+        'url': url_for('schedules.get_calendar_feed', kind=kind, record_id=record_id,
+                       token=token, _external=True)
+    }), 200
+
+@schedule_bp.route('/calendar/<kind>/<int:record_id>.ics', methods=['GET'])
+def get_calendar_feed(kind, record_id):
+    # Authenticated by the signed token in the subscription URL
+    if kind not in FEED_KINDS:
+        return jsonify({'error': 'Calendar kind must be instructor, section or lab-room'}), 404
+    
+    if not verify_feed_token(request.args.get('token', ''), kind, record_id):
+        return jsonify({'error': 'Invalid calendar token'}), 403
+    
+    # Feeds are cached until a schedule of this instructor, section or room changes
+    feed = get_feed(kind, record_id)
+    response = Response(feed, mimetype='text/calendar')
+    response.set_etag(hashlib.sha1(feed.encode()).hexdigest())
+    return response.make_conditional(request)
+
+@schedule_bp.route('/grids/<kind>/<int:record_id>', methods=['GET'])
+@jwt_required_custom
+@conditional_get(*SCHEDULE_TABLES)
+def get_timetable_grid(kind, record_id):
+    if kind not in GRID_KINDS:
+        return jsonify({'error': 'Grid kind must be section or lab-room'}), 404
     
-    return jsonify([schedule.to_dict() for schedule in schedules]), 200
+    try:
+        semester_id = int(request.args['semester_id'])
+    except KeyError:
+        return jsonify({'error': 'semester_id is required'}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid semester_id'}), 400
+    
+    # Week grids are kept in memory and patched as schedules change
+    return jsonify(timetable_grids.get(kind, semester_id, record_id)), 200
 
 @schedule_bp.route('/<int:schedule_id>', methods=['GET'])
 @jwt_required_custom
+@conditional_get(*SCHEDULE_TABLES)
 def get_schedule(schedule_id):
-    schedule = Schedule.query.get(schedule_id)
+    try:
+        fields = parse_fields(request.args, Schedule.FIELDS, Schedule.NESTED_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    schedule = Schedule.query.options(*Schedule.field_options(fields)).filter_by(id=schedule_id).first()
     
     if not schedule:
         return jsonify({'error': 'Schedule not found'}), 404
     
-    return jsonify(schedule.to_dict()), 200
+    return jsonify(schedule.to_dict(fields)), 200
+
+def schedule_slots(*criteria):
+    # (id, slot) of the schedules matching criteria, read without loading the rows
+    return [(row.id, make_slot(*row[1:])) for row in db.session.execute(select(
+        Schedule.id, Schedule.semester_id, Schedule.day_of_week, Schedule.lab_room_id,
+        Schedule.section_id, Schedule.instructor_id, Schedule.start_time, Schedule.end_time
+    ).where(*criteria))]
+
+def locked_conflict(slot, exclude_id=None):
+    # Lock the slot's (semester, day, room/section/instructor) rows, then run the
+    # authoritative SQL check; the locks are held until the caller commits
+    lock_slots([slot])
+    conflict = query_conflict(slot, exclude_id)
+    if conflict is None:
+        return None
+    db.session.rollback()
+    message, conflict_id = conflict
+    return message, Schedule.query.get(conflict_id)
 
 @schedule_bp.route('/', methods=['POST'])
 @jwt_required_custom
@@ -104,47 +435,21 @@ def create_schedule():
     if start_time >= end_time:
         return jsonify({'error': 'Start time must be before end time'}), 400
     
-    # Check for schedule conflicts
-    conflicts = Schedule.query.filter_by(
-        semester_id=data['semester_id'],
-        day_of_week=data['day_of_week'],
-        lab_room_id=data['lab_room_id']
-    ).all()
-    
-    for conflict in conflicts:
-        if (start_time < conflict.end_time and end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
-    
-    # Check for section conflicts (same section scheduled at the same time)
-    section_conflicts = Schedule.query.filter_by(
-        semester_id=data['semester_id'],
-        day_of_week=data['day_of_week'],
-        section_id=data['section_id']
-    ).all()
-    
-    for conflict in section_conflicts:
-        if (start_time < conflict.end_time and end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Section schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
-    
-    # Check for instructor conflicts (same instructor scheduled at the same time)
-    instructor_conflicts = Schedule.query.filter_by(
-        semester_id=data['semester_id'],
-        day_of_week=data['day_of_week'],
-        instructor_id=data['instructor_id']
-    ).all()
-    
-    for conflict in instructor_conflicts:
-        if (start_time < conflict.end_time and end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Instructor schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
+    # Check for room, section and instructor conflicts
+    slot = make_slot(data['semester_id'], data['day_of_week'], data['lab_room_id'],
+                     data['section_id'], data['instructor_id'], start_time, end_time)
+    conflict = find_conflicting_schedule(slot)
+    
+    # The in-memory index answers most conflicts; otherwise recheck under the
+    # slot locks so the check and the insert are atomic
+    if not conflict:
+        conflict = locked_conflict(slot)
+    if conflict:
+        message, conflicting_schedule = conflict
+        return jsonify({
+            'error': message,
+            'conflicting_schedule': conflicting_schedule.to_dict()
+        }), 409
     
     # Create new schedule
     current_user_id = get_jwt_identity()
@@ -185,6 +490,660 @@ def create_schedule():
         'schedule': new_schedule.to_dict()
     }), 201
 
+def read_schedule_batch():
+    # A JSON list (or {"schedules": [...]}), or CSV with a header row sent as the
+    # request body or as a "file" upload
+    upload = request.files.get('file')
+    if upload or request.mimetype == 'text/csv':
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('schedules')
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of schedules or a CSV file')
+    return data
+
+def parse_schedule_row(row):
+    if not isinstance(row, dict):
+        raise ValueError('Expected a schedule object')
+    
+    # Validate required fields
+    required_fields = ['semester_id', 'course_id', 'section_id', 'lab_room_id', 
+                       'instructor_id', 'day_of_week', 'start_time', 'end_time', 'is_lab']
+    for field in required_fields:
+        if row.get(field) in (None, ''):
+            raise ValueError(f'Missing required field: {field}')
+    
+    # Parse time strings to time objects
+    try:
+        start_time = datetime.strptime(row['start_time'], '%H:%M').time()
+        end_time = datetime.strptime(row['end_time'], '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid time format. Use HH:MM format.')
+    
+    # Validate time range
+    if start_time >= end_time:
+        raise ValueError('Start time must be before end time')
+    
+    # CSV values arrive as strings
+    is_lab = row['is_lab']
+    if isinstance(is_lab, str):
+        is_lab = is_lab.strip().lower() in ('1', 'true', 'yes')
+    
+    try:
+        values = {field: int(row[field]) for field in
+                  ['semester_id', 'course_id', 'section_id', 'lab_room_id', 'instructor_id']}
+    except (TypeError, ValueError):
+        raise ValueError('Ids must be integers')
+    
+    values.update(day_of_week=row['day_of_week'], start_time=start_time,
+                  end_time=end_time, is_lab=bool(is_lab))
+    return values
+
+@schedule_bp.route('/bulk', methods=['POST'])
+@jwt_required_custom
+@scheduling_permission_required
+def bulk_create_schedules():
+    try:
+        rows = read_schedule_batch()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    max_rows = current_app.config.get('SCHEDULE_BULK_MAX_ROWS', 5000)
+    if len(rows) > max_rows:
+        return jsonify({'error': f'At most {max_rows} schedules can be imported at once'}), 400
+    
+    # Validate every row on its own first
+    results = [None] * len(rows)
+    parsed = {}
+    for index, row in enumerate(rows):
+        try:
+            parsed[index] = parse_schedule_row(row)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    
+    # Hold the slot locks of the whole batch (in one global order) so nothing
+    # can be booked into these slots between the checks below and the insert
+    lock_slots([make_slot(values['semester_id'], values['day_of_week'], values['lab_room_id'],
+                          values['section_id'], values['instructor_id'],
+                          values['start_time'], values['end_time']) for values in parsed.values()])
+    
+    # Load the referenced records with one query per table
+    def lookup(model, field):
+        ids = {values[field] for values in parsed.values()}
+        if not ids:
+            return {}
+        return {record.id: record for record in model.query.filter(model.id.in_(ids)).all()}
+    
+    semesters = lookup(Semester, 'semester_id')
+    courses = lookup(Course, 'course_id')
+    sections = lookup(Section, 'section_id')
+    lab_rooms = lookup(LabRoom, 'lab_room_id')
+    instructors = lookup(User, 'instructor_id')
+    
+    # Snapshot of existing schedules for every (semester, day) in the batch; accepted
+    # rows are added to it under negative ids so the batch is checked against itself
+    buckets = load_buckets({values['semester_id'] for values in parsed.values()},
+                           {values['day_of_week'] for values in parsed.values()})
+    
+    current_user_id = get_jwt_identity()
+    new_schedules = []
+    notifications = []
+    
+    for index, values in parsed.items():
+        missing = [label for label, records, field in [
+            ('Semester', semesters, 'semester_id'),
+            ('Course', courses, 'course_id'),
+            ('Section', sections, 'section_id'),
+            ('Lab room', lab_rooms, 'lab_room_id'),
+            ('Instructor', instructors, 'instructor_id'),
+        ] if values[field] not in records]
+        if missing:
+            results[index] = {'index': index, 'status': 'error', 'error': f'{missing[0]} not found'}
+            continue
+        
+        slot = make_slot(values['semester_id'], values['day_of_week'], values['lab_room_id'],
+                         values['section_id'], values['instructor_id'],
+                         values['start_time'], values['end_time'])
+        bucket = buckets[(slot.semester_id, slot.day_of_week)]
+        conflict = bucket.find_conflict(slot)
+        if conflict:
+            message, conflict_id = conflict
+            result = {'index': index, 'status': 'error', 'error': message}
+            if conflict_id < 0:
+                result['conflicting_index'] = -conflict_id - 1
+            else:
+                result['conflicting_schedule_id'] = conflict_id
+            results[index] = result
+            continue
+        
+        bucket.add(-(index + 1), slot)
+        new_schedules.append(dict(values, created_by=current_user_id))
+        
+        course = courses[values['course_id']]
+        section = sections[values['section_id']]
+        lab_room = lab_rooms[values['lab_room_id']]
+        notifications.append({
+            'user_id': values['instructor_id'],
+            'title': 'New Schedule Assigned',
+            'message': f"You have been assigned to teach {course.code} for {section.program}-{section.name} in {lab_room.name} on {values['day_of_week']} from {values['start_time'].strftime('%H:%M')} to {values['end_time'].strftime('%H:%M')}."
+        })
+        results[index] = {'index': index, 'status': 'created'}
+    
+    if not new_schedules:
+        return jsonify({
+            'error': 'No schedules were created',
+            'created': 0,
+            'failed': len(rows),
+            'results': results
+        }), 400
+    
+    # Insert all accepted rows and their notifications in one transaction
+    db.session.execute(insert(Schedule), new_schedules)
+    db.session.execute(insert(Notification), notifications)
+    db.session.commit()
+    
+    # Bulk inserts bypass the session events, so drop the touched index buckets
+    for semester_id, day_of_week in {(values['semester_id'], values['day_of_week']) for values in new_schedules}:
+        schedule_index.invalidate(semester_id, day_of_week)
+    
+    return jsonify({
+        'message': f'{len(new_schedules)} schedules created successfully',
+        'created': len(new_schedules),
+        'failed': len(rows) - len(new_schedules),
+        'results': results
+    }), 201
+
+# Columns a bulk update or delete can select schedules by
+BULK_FILTERS = ['semester_id', 'course_id', 'section_id', 'lab_room_id', 'instructor_id', 'day_of_week']
+
+def select_bulk_targets(data):
+    # The schedules named by an "ids" list or matching every key of a "filter"
+    # object, as (id, semester_id, day_of_week, instructor_id) rows
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError('ids must be a non-empty list of schedule ids')
+        try:
+            criteria = [Schedule.id.in_({int(schedule_id) for schedule_id in ids})]
+        except (TypeError, ValueError):
+            raise ValueError('ids must be a non-empty list of schedule ids')
+    elif isinstance(filters, dict) and filters:
+        unknown = [field for field in filters if field not in BULK_FILTERS]
+        if unknown:
+            raise ValueError(f'Unsupported filter: {unknown[0]}')
+        criteria = [getattr(Schedule, field) == value for field, value in filters.items()]
+    else:
+        raise ValueError('Either ids or a filter is required')
+    
+    return db.session.execute(
+        select(Schedule.id, Schedule.semester_id, Schedule.day_of_week, Schedule.instructor_id)
+        .where(*criteria)
+    ).all()
+
+def summary_notifications(counts, title, action, yours=True):
+    # One notification per instructor instead of one per schedule
+    def message(count):
+        if count == 1:
+            return f"{'Your' if yours else 'A'} lab schedule was {action}."
+        return f"{count} {'of your ' if yours else ''}lab schedules were {action}."
+    
+    return [{
+        'user_id': instructor_id,
+        'title': title,
+        'message': message(count)
+    } for instructor_id, count in counts.items()]
+
+@schedule_bp.route('/bulk', methods=['PATCH'])
+@jwt_required_custom
+@scheduling_permission_required
+def bulk_update_schedules():
+    data = request.get_json(silent=True) or {}
+    
+    changes = data.get('changes')
+    if not isinstance(changes, dict) or not changes:
+        return jsonify({'error': 'Missing required field: changes'}), 400
+    
+    allowed = ['course_id', 'section_id', 'lab_room_id', 'instructor_id', 'day_of_week',
+               'start_time', 'end_time', 'is_lab']
+    unknown = [field for field in changes if field not in allowed]
+    if unknown:
+        return jsonify({'error': f'Field cannot be changed in bulk: {unknown[0]}'}), 400
+    
+    values = dict(changes)
+    for field in ('start_time', 'end_time'):
+        if field in values:
+            try:
+                values[field] = datetime.strptime(values[field], '%H:%M').time()
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Invalid time format. Use HH:MM format.'}), 400
+    
+    # Referenced records must exist
+    for label, model, field in [('Course', Course, 'course_id'), ('Section', Section, 'section_id'),
+                                ('Lab room', LabRoom, 'lab_room_id'), ('Instructor', User, 'instructor_id')]:
+        if field in values and not model.query.get(values[field]):
+            return jsonify({'error': f'{label} not found'}), 404
+    
+    try:
+        targets = select_bulk_targets(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not targets:
+        return jsonify({'error': 'No schedules matched'}), 404
+    
+    max_rows = current_app.config.get('SCHEDULE_BULK_MAX_ROWS', 5000)
+    if len(targets) > max_rows:
+        return jsonify({'error': f'At most {max_rows} schedules can be changed at once'}), 400
+    
+    # Lock the keys the targets hold now and will hold once changed, so no single
+    # create or update can book the new slots before this commits. The targets
+    # are read again once locked, in case another writer moved one meanwhile.
+    ids = [target.id for target in targets]
+    locked = []
+    while True:
+        current = schedule_slots(Schedule.id.in_(ids))
+        slots = [new_slot for _, slot in current for new_slot in (
+            slot, make_slot(**dict(slot._asdict(), **{field: values[field] for field in slot._fields if field in values}))
+        )]
+        if set(lock_keys(slots)) <= set(lock_keys(locked)):
+            break
+        locked += slots
+        lock_slots(locked)
+    
+    # Apply the change to the whole set with one statement
+    db.session.execute(
+        update(Schedule).where(Schedule.id.in_(ids)).values(**values, updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    
+    # Validate the time ranges and conflicts of the changed set once
+    if 'start_time' in values or 'end_time' in values:
+        invalid = db.session.execute(
+            select(Schedule.id).where(Schedule.id.in_(ids), Schedule.start_time >= Schedule.end_time).limit(1)
+        ).scalar()
+        if invalid is not None:
+            db.session.rollback()
+            return jsonify({'error': 'Start time must be before end time', 'schedule_id': invalid}), 400
+    
+    semester_ids = {slot.semester_id for _, slot in current}
+    conflicts = query_conflict_pairs(semester_ids, ids=ids)
+    if conflicts:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Updated schedules would conflict',
+            'conflicts': [{
+                'error': message,
+                'schedule_id': schedule_id,
+                'conflicting_schedule_id': conflicting_id
+            } for message, schedule_id, conflicting_id in conflicts]
+        }), 409
+    
+    # Batch the notifications: one per affected instructor
+    counts = Counter(slot.instructor_id for _, slot in current)
+    if 'instructor_id' in values:
+        new_instructor_id = int(values['instructor_id'])
+        counts.pop(new_instructor_id, None)
+        notifications = summary_notifications(counts, 'Schedules Updated', 'reassigned to another instructor')
+        notifications += summary_notifications({new_instructor_id: len(current)}, 'Schedule Assignment',
+                                              'assigned to you', yours=False)
+    else:
+        notifications = summary_notifications(counts, 'Schedules Updated', 'updated')
+    db.session.execute(insert(Notification), notifications)
+    db.session.commit()
+    
+    # Bulk statements bypass the session events, so drop the touched index buckets
+    for semester_id in semester_ids:
+        schedule_index.invalidate(semester_id)
+    
+    return jsonify({
+        'message': f'{len(ids)} schedules updated successfully',
+        'updated': len(ids),
+        'schedule_ids': ids
+    }), 200
+
+@schedule_bp.route('/bulk', methods=['DELETE'])
+@jwt_required_custom
+@scheduling_permission_required
+def bulk_delete_schedules():
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        targets = select_bulk_targets(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not targets:
+        return jsonify({'error': 'No schedules matched'}), 404
+    
+    max_rows = current_app.config.get('SCHEDULE_BULK_MAX_ROWS', 5000)
+    if len(targets) > max_rows:
+        return jsonify({'error': f'At most {max_rows} schedules can be deleted at once'}), 400
+    
+    ids = [target.id for target in targets]
+    db.session.execute(delete(Schedule).where(Schedule.id.in_(ids)),
+                       execution_options={'synchronize_session': False})
+    
+    # Bulk deletes skip the flush events, so log their tombstones here
+    db.session.execute(insert(ScheduleDeletion), [
+        {'schedule_id': target.id, 'semester_id': target.semester_id} for target in targets
+    ])
+    
+    counts = Counter(target.instructor_id for target in targets)
+    db.session.execute(insert(Notification), summary_notifications(counts, 'Schedule Cancelled', 'cancelled'))
+    db.session.commit()
+    
+    # Bulk statements bypass the session events, so drop the touched index buckets
+    for semester_id, day_of_week in {(target.semester_id, target.day_of_week) for target in targets}:
+        schedule_index.invalidate(semester_id, day_of_week)
+    
+    return jsonify({
+        'message': f'{len(ids)} schedules deleted successfully',
+        'deleted': len(ids),
+        'schedule_ids': ids
+    }), 200
+
+def parse_candidate(row):
+    # Only the fields the conflict checks need; schedule_id marks an existing
+    # schedule being moved, which is not counted as its own conflict
+    if not isinstance(row, dict):
+        raise ValueError('Expected a schedule object')
+    
+    required_fields = ['semester_id', 'section_id', 'lab_room_id', 'instructor_id',
+                       'day_of_week', 'start_time', 'end_time']
+    for field in required_fields:
+        if row.get(field) in (None, ''):
+            raise ValueError(f'Missing required field: {field}')
+    
+    try:
+        start_time = datetime.strptime(row['start_time'], '%H:%M').time()
+        end_time = datetime.strptime(row['end_time'], '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid time format. Use HH:MM format.')
+    
+    if start_time >= end_time:
+        raise ValueError('Start time must be before end time')
+    
+    try:
+        slot = make_slot(row['semester_id'], row['day_of_week'], row['lab_room_id'], row['section_id'],
+                         row['instructor_id'], start_time, end_time)
+        schedule_id = int(row['schedule_id']) if row.get('schedule_id') not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('Ids must be integers')
+    return slot, schedule_id
+
+@schedule_bp.route('/validate', methods=['POST'])
+@jwt_required_custom
+def validate_schedules():
+    try:
+        rows = read_schedule_batch()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    max_rows = current_app.config.get('SCHEDULE_BULK_MAX_ROWS', 5000)
+    if len(rows) > max_rows:
+        return jsonify({'error': f'At most {max_rows} schedules can be validated at once'}), 400
+    
+    # Candidates are alternatives by default; as_batch also checks them against
+    # each other, as POST /bulk would
+    data = request.get_json(silent=True)
+    as_batch = isinstance(data, dict) and bool(data.get('as_batch'))
+    
+    results = [None] * len(rows)
+    candidates = {}
+    for index, row in enumerate(rows):
+        try:
+            candidates[index] = parse_candidate(row)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    
+    # One snapshot of every (semester, day) involved, loaded in a single query
+    buckets = load_buckets({slot.semester_id for slot, _ in candidates.values()},
+                           {slot.day_of_week for slot, _ in candidates.values()})
+    
+    for index, (slot, schedule_id) in candidates.items():
+        bucket = buckets[(slot.semester_id, slot.day_of_week)]
+        conflict_ids = bucket.conflicts(slot, exclude_id=schedule_id)
+        if not conflict_ids:
+            results[index] = {'index': index, 'status': 'ok'}
+            if as_batch:
+                # A moved schedule no longer occupies its old slot
+                for old_bucket in buckets.values():
+                    if schedule_id in old_bucket.slots:
+                        old_bucket.remove(schedule_id, old_bucket.slots[schedule_id])
+                bucket.add(-(index + 1), slot)
+            continue
+        
+        message, _ = bucket.find_conflict(slot, exclude_id=schedule_id)
+        results[index] = {
+            'index': index,
+            'status': 'conflict',
+            'error': message,
+            'conflicting_schedule_ids': sorted(conflict_id for conflict_id in conflict_ids if conflict_id > 0),
+            'conflicting_indexes': sorted(-conflict_id - 1 for conflict_id in conflict_ids if conflict_id < 0)
+        }
+    
+    return jsonify({
+        'valid': all(result['status'] == 'ok' for result in results),
+        'results': results
+    }), 200
+
+def check_demand(demand):
+    if not isinstance(demand, dict):
+        raise ValueError('must be an object')
+    for field in ['course_id', 'section_id', 'instructor_id', 'hours_per_week']:
+        if field not in demand:
+            raise ValueError(f'missing required field: {field}')
+    try:
+        for field in ['course_id', 'section_id', 'instructor_id']:
+            int(demand[field])
+        for field in ['hours_per_week', 'session_hours', 'min_capacity']:
+            if demand.get(field) is not None:
+                float(demand[field])
+    except (TypeError, ValueError):
+        raise ValueError('ids, hours and min_capacity must be numbers')
+    for field in ['lab_room_ids', 'alternate_instructor_ids']:
+        ids = demand.get(field)
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            raise ValueError(f'{field} must be a list of ids')
+    days = demand.get('days')
+    if days is not None and (not isinstance(days, list) or not all(day in WEEKDAYS for day in days)):
+        raise ValueError('days must be a list of weekdays')
+    windows = demand.get('windows')
+    if windows is None:
+        return
+    if not isinstance(windows, list):
+        raise ValueError('windows must be a list')
+    for position, window in enumerate(windows):
+        try:
+            start, end = to_minutes(window['start']), to_minutes(window['end'])
+        except (TypeError, KeyError, AttributeError, ValueError):
+            raise ValueError(f'window {position} must have start and end times (HH:MM)')
+        if not 0 <= start < end < 24 * 60:
+            raise ValueError(f'window {position}: start must be before end')
+
+@schedule_bp.route('/generate', methods=['POST'])
+@jwt_required_custom
+@scheduling_permission_required
+def generate_timetable():
+    data = request.get_json()
+    
+    # Validate required fields
+    if not data or 'semester_id' not in data or not isinstance(data.get('demands'), list):
+        return jsonify({'error': 'semester_id and a list of demands are required'}), 400
+    
+    max_demands = current_app.config.get('TIMETABLE_MAX_DEMANDS', 500)
+    if len(data['demands']) > max_demands:
+        return jsonify({'error': f'At most {max_demands} demands can be generated at once'}), 400
+    
+    for index, demand in enumerate(data['demands']):
+        try:
+            check_demand(demand)
+        except ValueError as e:
+            return jsonify({'error': f'Demand {index}: {e}'}), 400
+    
+    try:
+        semester_id = int(data['semester_id'])
+        time_budget = float(data.get('time_budget', current_app.config.get('TIMETABLE_TIME_BUDGET', 5)))
+        step_minutes = int(data.get('step_minutes', 30))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'semester_id, time_budget and step_minutes must be numbers'}), 400
+    if time_budget <= 0:
+        return jsonify({'error': 'time_budget must be positive'}), 400
+    min_step = current_app.config.get('TIMETABLE_MIN_STEP', 15)
+    if step_minutes < min_step:
+        return jsonify({'error': f'step_minutes must be at least {min_step}'}), 400
+    time_budget = min(time_budget, current_app.config.get('TIMETABLE_MAX_TIME_BUDGET', 30))
+    
+    if not Semester.query.get(semester_id):
+        return jsonify({'error': 'Semester not found'}), 404
+    
+    # Existing schedules of the semester are fixed; the generator fits around them
+    rooms = [(room.id, room.capacity) for room in LabRoom.query.filter_by(is_active=True).all()]
+    days = {day for demand in data['demands'] for day in demand.get('days') or DEFAULT_DAYS}
+    buckets = load_buckets({semester_id}, days)
+    
+    try:
+        solver = TimetableSolver(semester_id, data['demands'], rooms, buckets,
+                                 step_minutes=step_minutes, seed=data.get('seed'),
+                                 max_sessions=current_app.config.get('TIMETABLE_MAX_SESSIONS', 1000))
+        result = solver.solve(time_budget=time_budget)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The proposed schedules can be saved as-is through POST /api/schedules/bulk
+    return jsonify(result), 200
+
+def parse_id_map(data, field):
+    # {"old_id": new_id} from a JSON object; keys arrive as strings
+    mapping = data.get(field) or {}
+    if not isinstance(mapping, dict):
+        raise ValueError(f'{field} must be an object mapping old ids to new ids')
+    try:
+        return {int(old_id): int(new_id) for old_id, new_id in mapping.items()}
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must map ids to ids')
+
+@schedule_bp.route('/semesters/<int:semester_id>/clone', methods=['POST'])
+@jwt_required_custom
+@scheduling_permission_required
+def clone_semester_schedules(semester_id):
+    data = request.get_json(silent=True) or {}
+    
+    # Validate required fields
+    if 'target_semester_id' not in data:
+        return jsonify({'error': 'Missing required field: target_semester_id'}), 400
+    
+    try:
+        target_semester_id = int(data['target_semester_id'])
+        room_map = parse_id_map(data, 'lab_room_map')
+        instructor_map = parse_id_map(data, 'instructor_map')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if target_semester_id == semester_id:
+        return jsonify({'error': 'Target semester must differ from the source semester'}), 400
+    
+    source = Semester.query.get(semester_id)
+    target = Semester.query.get(target_semester_id)
+    if not source or not target:
+        return jsonify({'error': 'Semester not found'}), 404
+    
+    # Remapping targets must exist
+    if room_map and LabRoom.query.filter(LabRoom.id.in_(set(room_map.values()))).count() != len(set(room_map.values())):
+        return jsonify({'error': 'Lab room not found'}), 404
+    if instructor_map and User.query.filter(User.id.in_(set(instructor_map.values()))).count() != len(set(instructor_map.values())):
+        return jsonify({'error': 'Instructor not found'}), 404
+    
+    def remapped(column, mapping):
+        return case(mapping, value=column, else_=column) if mapping else column
+    
+    # Lock every key the copies will hold in the target semester, so no single
+    # create or update can book those slots before the copy commits
+    copies = [make_slot(target_semester_id, slot.day_of_week, room_map.get(slot.lab_room_id, slot.lab_room_id),
+                        slot.section_id, instructor_map.get(slot.instructor_id, slot.instructor_id),
+                        slot.start_time, slot.end_time)
+              for _, slot in schedule_slots(Schedule.semester_id == semester_id)]
+    lock_slots(copies)
+    
+    # Copy every row with a single INSERT ... SELECT; rows above last_id are the copies
+    last_id = db.session.query(func.max(Schedule.id)).scalar() or 0
+    now = datetime.utcnow()
+    columns = ['semester_id', 'course_id', 'section_id', 'lab_room_id', 'instructor_id', 'day_of_week',
+               'start_time', 'end_time', 'is_lab', 'created_by', 'created_at', 'updated_at']
+    copied = db.session.execute(insert(Schedule).from_select(columns, select(
+        literal(target_semester_id),
+        Schedule.course_id,
+        Schedule.section_id,
+        remapped(Schedule.lab_room_id, room_map),
+        remapped(Schedule.instructor_id, instructor_map),
+        Schedule.day_of_week,
+        Schedule.start_time,
+        Schedule.end_time,
+        Schedule.is_lab,
+        literal(int(get_jwt_identity())),
+        literal(now),
+        literal(now)
+    ).where(Schedule.semester_id == semester_id).order_by(Schedule.id))).rowcount
+    
+    if not copied:
+        db.session.rollback()
+        return jsonify({'error': 'Source semester has no schedules'}), 400
+    
+    # A source schedule written between the lock and the copy may sit on a key
+    # that was not locked
+    written = [slot for _, slot in schedule_slots(Schedule.semester_id == target_semester_id, Schedule.id > last_id)]
+    if not set(lock_keys(written)) <= set(lock_keys(copies)):
+        db.session.rollback()
+        return jsonify({'error': 'Source semester changed while cloning, please retry'}), 409
+    
+    # Check the copies against the target semester (and each other) in one query
+    conflicts = query_conflict_pairs([target_semester_id], after_id=last_id)
+    if conflicts:
+        # Describe the offending rows before the copy is rolled back; copies have
+        # no id of their own outside this transaction
+        involved = {schedule_id for _, *pair in conflicts for schedule_id in pair}
+        rows = {schedule.id: schedule.to_row_dict() for schedule in Schedule.query.filter(Schedule.id.in_(involved))}
+        for schedule_id, row in rows.items():
+            if schedule_id > last_id:
+                row.pop('id')
+        db.session.rollback()
+        return jsonify({
+            'error': 'Cloned schedules conflict with the target semester',
+            'conflicts': [{
+                'error': message,
+                'schedule': rows[schedule_id],
+                'conflicting_schedule': rows[conflicting_id]
+            } for message, schedule_id, conflicting_id in conflicts]
+        }), 409
+    
+    # One notification per instructor instead of one per schedule
+    counts = db.session.execute(
+        select(Schedule.instructor_id, func.count())
+        .where(Schedule.semester_id == target_semester_id, Schedule.id > last_id)
+        .group_by(Schedule.instructor_id)
+    ).all()
+    db.session.execute(insert(Notification), [{
+        'user_id': instructor_id,
+        'title': 'New Schedules Assigned',
+        'message': f"You have been assigned {count} {'class' if count == 1 else 'classes'} for {target.name} {target.school_year}, copied from {source.name} {source.school_year}."
+    } for instructor_id, count in counts])
+    db.session.commit()
+    
+    # Bulk inserts bypass the session events, so drop the target semester's index buckets
+    schedule_index.invalidate(target_semester_id)
+    
+    return jsonify({
+        'message': f'{copied} schedules cloned successfully',
+        'created': copied,
+        'source_semester_id': semester_id,
+        'target_semester_id': target_semester_id,
+        'notified_instructors': len(counts)
+    }), 201
+
 @schedule_bp.route('/<int:schedule_id>', methods=['PUT'])
 @jwt_required_custom
 @scheduling_permission_required
@@ -196,85 +1155,51 @@ def update_schedule(schedule_id):
     
     data = request.get_json()
     
-    # Update fields if provided
-    if 'course_id' in data:
-        schedule.course_id = data['course_id']
-    
-    if 'section_id' in data:
-        schedule.section_id = data['section_id']
-    
-    if 'lab_room_id' in data:
-        schedule.lab_room_id = data['lab_room_id']
-    
-    if 'instructor_id' in data:
-        schedule.instructor_id = data['instructor_id']
-    
-    if 'day_of_week' in data:
-        schedule.day_of_week = data['day_of_week']
+    # Collect the changes without touching the schedule: the slot locks below
+    # must be taken before anything in the session changes
+    fields = ['course_id', 'section_id', 'lab_room_id', 'instructor_id',
+              'day_of_week', 'start_time', 'end_time', 'is_lab']
+    changes = {field: data[field] for field in fields if field in data}
     
     if 'start_time' in data:
         try:
-            schedule.start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+            changes['start_time'] = datetime.strptime(data['start_time'], '%H:%M').time()
         except ValueError:
             return jsonify({'error': 'Invalid start time format. Use HH:MM format.'}), 400
     
     if 'end_time' in data:
         try:
-            schedule.end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+            changes['end_time'] = datetime.strptime(data['end_time'], '%H:%M').time()
         except ValueError:
             return jsonify({'error': 'Invalid end time format. Use HH:MM format.'}), 400
     
-    if 'is_lab' in data:
-        schedule.is_lab = data['is_lab']
+    values = dict({field: getattr(schedule, field) for field in fields}, **changes)
     
     # Validate time range
-    if schedule.start_time >= schedule.end_time:
+    if values['start_time'] >= values['end_time']:
         return jsonify({'error': 'Start time must be before end time'}), 400
     
-    # Check for schedule conflicts (excluding this schedule)
-    conflicts = Schedule.query.filter(
-        Schedule.id != schedule_id,
-        Schedule.semester_id == schedule.semester_id,
-        Schedule.day_of_week == schedule.day_of_week,
-        Schedule.lab_room_id == schedule.lab_room_id
-    ).all()
-    
-    for conflict in conflicts:
-        if (schedule.start_time < conflict.end_time and schedule.end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
-    
-    # Check for section conflicts
-    section_conflicts = Schedule.query.filter(
-        Schedule.id != schedule_id,
-        Schedule.semester_id == schedule.semester_id,
-        Schedule.day_of_week == schedule.day_of_week,
-        Schedule.section_id == schedule.section_id
-    ).all()
-    
-    for conflict in section_conflicts:
-        if (schedule.start_time < conflict.end_time and schedule.end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Section schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
-    
-    # Check for instructor conflicts
-    instructor_conflicts = Schedule.query.filter(
-        Schedule.id != schedule_id,
-        Schedule.semester_id == schedule.semester_id,
-        Schedule.day_of_week == schedule.day_of_week,
-        Schedule.instructor_id == schedule.instructor_id
-    ).all()
-    
-    for conflict in instructor_conflicts:
-        if (schedule.start_time < conflict.end_time and schedule.end_time > conflict.start_time):
-            return jsonify({
-                'error': 'Instructor schedule conflict detected',
-                'conflicting_schedule': conflict.to_dict()
-            }), 409
+    # Check for room, section and instructor conflicts (excluding this schedule)
+    slot = make_slot(schedule.semester_id, values['day_of_week'], values['lab_room_id'],
+                     values['section_id'], values['instructor_id'], values['start_time'], values['end_time'])
+    conflict = find_conflicting_schedule(slot, exclude_id=schedule_id)
+    
+    if not conflict:
+        conflict = locked_conflict(slot, exclude_id=schedule_id)
+    if conflict:
+        message, conflicting_schedule = conflict
+        return jsonify({
+            'error': message,
+            'conflicting_schedule': conflicting_schedule.to_dict()
+        }), 409
+    
+    # Apply the changes under the locks, to the row as it is now
+    schedule = Schedule.query.get(schedule_id)
+    if not schedule:
+        db.session.rollback()
+        return jsonify({'error': 'Schedule not found'}), 404
+    for field, value in changes.items():
+        setattr(schedule, field, value)
     
     # Create notification for the instructor if instructor changed
     if 'instructor_id' in data and data['instructor_id'] != schedule.instructor_id:
@@ -325,11 +1250,17 @@ def delete_schedule(schedule_id):
     
     return jsonify({'message': 'Schedule deleted successfully'}), 200
 
+def _first_dict(query):
+    record = query.first()
+    return record.to_dict() if record else None
+
 @schedule_bp.route('/semesters', methods=['GET'])
 @jwt_required_custom
+@conditional_get('semesters')
 def get_all_semesters():
-    semesters = Semester.query.all()
-    return jsonify([semester.to_dict() for semester in semesters]), 200
+    semesters = reference_cache.get_or_load(
+        ('semesters',), lambda: [semester.to_dict() for semester in Semester.query.all()])
+    return jsonify(semesters), 200
 
 @schedule_bp.route('/semesters', methods=['POST'])
 @jwt_required_custom
@@ -365,6 +1296,7 @@ def create_semester():
     
     db.session.add(new_semester)
     db.session.commit()
+    reference_cache.invalidate('semesters')
     
     return jsonify({
         'message': 'Semester created successfully',
@@ -373,22 +1305,25 @@ def create_semester():
 
 @schedule_bp.route('/courses', methods=['GET'])
 @jwt_required_custom
+@conditional_get('courses')
 def get_all_courses():
     # Check if code parameter is provided
     code = request.args.get('code')
     
     if code:
         # Find course by code
-        course = Course.query.filter_by(code=code).first()
+        course = reference_cache.get_or_load(('courses', 'code', code), lambda: _first_dict(
+            Course.query.filter_by(code=code)))
         
         if not course:
             return jsonify({'error': 'Course not found'}), 404
         
-        return jsonify(course.to_dict()), 200
+        return jsonify(course), 200
     
     # Get all courses
-    courses = Course.query.all()
-    return jsonify([course.to_dict() for course in courses]), 200
+    courses = reference_cache.get_or_load(
+        ('courses',), lambda: [course.to_dict() for course in Course.query.all()])
+    return jsonify(courses), 200
 
 @schedule_bp.route('/courses', methods=['POST'])
 @jwt_required_custom
@@ -416,6 +1351,7 @@ def create_course():
     
     db.session.add(new_course)
     db.session.commit()
+    reference_cache.invalidate('courses')
     
     return jsonify({
         'message': 'Course created successfully',
@@ -424,6 +1360,7 @@ def create_course():
 
 @schedule_bp.route('/sections', methods=['GET'])
 @jwt_required_custom
+@conditional_get('sections')
 def get_all_sections():
     # Check if program and name parameters are provided
     program = request.args.get('program')
@@ -431,16 +1368,18 @@ def get_all_sections():
     
     if program and name:
         # Find section by program and name
-        section = Section.query.filter_by(program=program, name=name).first()
+        section = reference_cache.get_or_load(('sections', 'name', program, name), lambda: _first_dict(
+            Section.query.filter_by(program=program, name=name)))
         
         if not section:
             return jsonify({'error': 'Section not found'}), 404
         
-        return jsonify(section.to_dict()), 200
+        return jsonify(section), 200
     
     # Get all sections
-    sections = Section.query.all()
-    return jsonify([section.to_dict() for section in sections]), 200
+    sections = reference_cache.get_or_load(
+        ('sections',), lambda: [section.to_dict() for section in Section.query.all()])
+    return jsonify(sections), 200
 
 @schedule_bp.route('/sections', methods=['POST'])
 @jwt_required_custom
@@ -463,6 +1402,7 @@ def create_section():
     
     db.session.add(new_section)
     db.session.commit()
+    reference_cache.invalidate('sections')
     
     return jsonify({
         'message': 'Section created successfully',
@@ -471,22 +1411,25 @@ def create_section():
 
 @schedule_bp.route('/lab-rooms', methods=['GET'])
 @jwt_required_custom
+@conditional_get('lab_rooms')
 def get_all_lab_rooms():
     # Check if name parameter is provided
     name = request.args.get('name')
     
     if name:
         # Find lab room by name
-        lab_room = LabRoom.query.filter_by(name=name).first()
+        lab_room = reference_cache.get_or_load(('lab_rooms', 'name', name), lambda: _first_dict(
+            LabRoom.query.filter_by(name=name)))
         
         if not lab_room:
             return jsonify({'error': 'Lab room not found'}), 404
         
-        return jsonify(lab_room.to_dict()), 200
+        return jsonify(lab_room), 200
     
     # Get all lab rooms
-    lab_rooms = LabRoom.query.all()
-    return jsonify([lab_room.to_dict() for lab_room in lab_rooms]), 200
+    lab_rooms = reference_cache.get_or_load(
+        ('lab_rooms',), lambda: [lab_room.to_dict() for lab_room in LabRoom.query.all()])
+    return jsonify(lab_rooms), 200
 
 @schedule_bp.route('/lab-rooms', methods=['POST'])
 @jwt_required_custom
@@ -514,6 +1457,7 @@ def create_lab_room():
     
     db.session.add(new_lab_room)
     db.session.commit()
+    reference_cache.invalidate('lab_rooms')
     
     return jsonify({
         'message': 'Lab room created successfully',
@@ -1,9 +1,21 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from models import User, Role, Permission, ProfilePic
+from models import User, Role, Permission, ProfilePic, Notification, Schedule, ScheduleDeletion, UserImport
 from extensions import db
+from pagination import wants_page, keyset_page, parse_limit
+from fieldsets import parse_fields
+from auth_claims import current_role_names
+from user_summaries import user_summaries, role_permission_map
+from user_imports import insert_users, start_import
+from schedule_index import schedule_index
+from cache import reference_cache
+from password_hashing import password_hasher, PasswordHashBusy, busy_response
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import and_, case, delete, insert, or_, select
+from sqlalchemy.exc import IntegrityError
 from functools import wraps
 import base64
+import csv
 import io
 from PIL import Image
 
@@ -27,10 +39,9 @@ def admin_required(fn):
     def wrapper(*args, **kwargs):
         try:
             verify_jwt_in_request()
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
             
-            if not user or not user.has_role('System Administrator'):
+            # Checked against the token's role claims, without a query
+            if 'System Administrator' not in current_role_names():
                 return jsonify({'error': 'Admin privileges required'}), 403
             
             return fn(*args, **kwargs)
@@ -47,8 +58,14 @@ def get_all_users():
     first_name = request.args.get('first_name')
     last_name = request.args.get('last_name')
     
-    # Start with base query
-    query = User.query
+    try:
+        fields = parse_fields(request.args, User.FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Start with base query over plain columns; roles and permissions are
+    # attached per page by user_summaries()
+    query = User.query.options(*User.summary_options(fields))
     
     # Apply filters if provided
     if role:
@@ -61,26 +78,96 @@ def get_all_users():
     if last_name:
         query = query.filter(User.last_name == last_name)
     
-    # Execute query
+    # Execute query, one page at a time if limit or cursor is given
+    if wants_page(request.args):
+        try:
+            users, next_cursor = keyset_page(query, [User.id], request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'users': user_summaries(users, fields),
+            'next_cursor': next_cursor
+        }), 200
+    
     users = query.all()
     
-    return jsonify([user.to_dict() for user in users]), 200
+    return jsonify(user_summaries(users, fields)), 200
+
+def prefix_pattern(text):
+    # LIKE pattern matching values that start with text, wildcards escaped with '/'
+    return text.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+
+@user_bp.route('/search', methods=['GET'])
+@jwt_required_custom
+def search_users():
+    q = ' '.join(request.args.get('q', '').replace(',', ' ').split())
+    role = request.args.get('role')
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    
+    try:
+        fields = parse_fields(request.args, User.FIELDS)
+        limit = parse_limit(request.args, current_app.config.get('USER_SEARCH_LIMIT', 20),
+                            current_app.config.get('USER_SEARCH_MAX_LIMIT', 100))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Every condition is a prefix match on an indexed column
+    def starts(column, text):
+        return column.like(prefix_pattern(text), escape='/')
+    
+    exact = or_(User.student_id == q, User.email == q)
+    last_name = starts(User.last_name, q)
+    first_name = starts(User.first_name, q)
+    conditions = [exact, last_name, first_name, starts(User.email, q), starts(User.student_id, q)]
+    
+    # "Maria Garc" or "Garcia, Maria": first word against one name, the rest against the other
+    words = q.split(' ', 1)
+    full_name = None
+    if len(words) == 2:
+        full_name = or_(
+            and_(starts(User.first_name, words[0]), starts(User.last_name, words[1])),
+            and_(starts(User.last_name, words[0]), starts(User.first_name, words[1]))
+        )
+        conditions.append(full_name)
+    
+    # Exact id or email first, then full name, last name, first name, other prefixes
+    rank = case(
+        (exact, 0),
+        *([(full_name, 1)] if full_name is not None else []),
+        (last_name, 2),
+        (first_name, 3),
+        else_=4
+    )
+    
+    query = User.query.options(*User.summary_options(fields)).filter(or_(*conditions))
+    if role:
+        query = query.join(User.roles).filter(Role.name == role)
+    
+    users = query.order_by(rank, User.last_name, User.first_name, User.id).limit(limit).all()
+    
+    return jsonify(user_summaries(users, fields)), 200
 
 @user_bp.route('/<int:user_id>', methods=['GET'])
 @jwt_required_custom
 def get_user(user_id):
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
     
     # Only allow admins to view other users' details
-    if current_user_id != user_id and not current_user.has_role('System Administrator'):
+    if current_user_id != user_id and 'System Administrator' not in current_role_names():
         return jsonify({'error': 'Unauthorized to view this user'}), 403
     
-    user = User.query.get(user_id)
+    try:
+        fields = parse_fields(request.args, User.FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user = User.query.options(*User.field_options(fields)).filter_by(id=user_id).first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify(user.to_dict()), 200
+    return jsonify(user.to_dict(fields)), 200
 
 @user_bp.route('/', methods=['POST'])
 @admin_required
@@ -108,7 +195,10 @@ def create_user():
         first_name=data['first_name'],
         last_name=data['last_name']
     )
-    new_user.password = data['password']  # This will hash the password
+    try:
+        new_user.password = data['password']  # This will hash the password
+    except PasswordHashBusy:
+        return busy_response()
     
     # Assign roles
     for role_name in data['roles']:
@@ -125,14 +215,174 @@ def create_user():
         'user': new_user.to_dict()
     }), 201
 
+def read_user_batch():
+    # A JSON list (or {"users": [...]}), or CSV with a header row sent as the
+    # request body or as a "file" upload
+    upload = request.files.get('file')
+    if upload or request.mimetype == 'text/csv':
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of users or a CSV file')
+    return data
+
+def parse_user_row(row):
+    if not isinstance(row, dict):
+        raise ValueError('Expected a user object')
+    
+    # Validate required fields
+    required_fields = ['email', 'password', 'first_name', 'last_name', 'student_id']
+    for field in required_fields:
+        if row.get(field) in (None, ''):
+            raise ValueError(f'Missing required field: {field}')
+    
+    # Validate email format (no DNS lookups for a whole intake)
+    try:
+        email = validate_email(str(row['email']), check_deliverability=False).email
+    except EmailNotValidError as e:
+        raise ValueError(str(e))
+    
+    # Validate password strength
+    if len(str(row['password'])) < 8:
+        raise ValueError('Password must be at least 8 characters long')
+    
+    # Students unless roles are given; CSV cells separate role names with ";"
+    roles = row.get('roles') or ['Student']
+    if isinstance(roles, str):
+        roles = [name.strip() for name in roles.split(';') if name.strip()]
+    if not isinstance(roles, list) or not all(isinstance(name, str) for name in roles):
+        raise ValueError('roles must be a list of role names')
+    
+    return {
+        'email': email,
+        'student_id': str(row['student_id']).strip(),
+        'first_name': str(row['first_name']).strip(),
+        'last_name': str(row['last_name']).strip(),
+        'classification': row.get('classification') or None,
+        'password': str(row['password']),
+        'roles': roles
+    }
+
+@user_bp.route('/bulk', methods=['POST'])
+@admin_required
+def bulk_create_users():
+    try:
+        rows = read_user_batch()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    max_rows = current_app.config.get('USER_BULK_MAX_ROWS', 10000)
+    if len(rows) > max_rows:
+        return jsonify({'error': f'At most {max_rows} users can be imported at once'}), 400
+    
+    # Validate every row on its own first
+    results = [None] * len(rows)
+    parsed = {}
+    for index, row in enumerate(rows):
+        try:
+            parsed[index] = parse_user_row(row)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+    
+    # Emails and student IDs already registered, in one query for the whole batch
+    emails = {values['email'].lower() for values in parsed.values()}
+    student_ids = {values['student_id'] for values in parsed.values()}
+    taken_emails, taken_student_ids = set(), set()
+    if parsed:
+        for email, student_id in db.session.execute(
+                select(User.email, User.student_id)
+                .where(or_(User.email.in_(emails), User.student_id.in_(student_ids)))):
+            taken_emails.add(email.lower())
+            taken_student_ids.add(student_id)
+    
+    role_ids = {name: role_id for role_id, (name, _) in role_permission_map().items()}
+    if any(name not in role_ids for values in parsed.values() for name in values['roles']):
+        # Possibly a role created by another worker since the map was built
+        reference_cache.invalidate('roles')
+        role_ids = {name: role_id for role_id, (name, _) in role_permission_map().items()}
+    
+    accepted = {}
+    seen_emails, seen_student_ids = {}, {}
+    for index, values in parsed.items():
+        email = values['email'].lower()
+        unknown = [name for name in values['roles'] if name not in role_ids]
+        if email in taken_emails:
+            error = {'error': 'Email already registered'}
+        elif values['student_id'] in taken_student_ids:
+            error = {'error': 'Student ID already registered'}
+        elif email in seen_emails:
+            error = {'error': 'Duplicate email in batch', 'duplicate_of_index': seen_emails[email]}
+        elif values['student_id'] in seen_student_ids:
+            error = {'error': 'Duplicate student ID in batch', 'duplicate_of_index': seen_student_ids[values['student_id']]}
+        elif unknown:
+            error = {'error': f'Role not found: {unknown[0]}'}
+        else:
+            error = None
+        
+        if error:
+            results[index] = dict({'index': index, 'status': 'error'}, **error)
+            continue
+        seen_emails[email] = index
+        seen_student_ids[values['student_id']] = index
+        accepted[index] = values
+    
+    if not accepted:
+        return jsonify({
+            'error': 'No users were created',
+            'created': 0,
+            'failed': len(rows),
+            'results': results
+        }), 400
+    
+    # Larger uploads are processed in the background; poll GET /api/users/bulk/<id>
+    if len(accepted) > current_app.config.get('USER_BULK_SYNC_ROWS', 50):
+        user_import = start_import(current_app._get_current_object(), get_jwt_identity(),
+                                   accepted, role_ids, results)
+        return jsonify({
+            'message': f'Importing {len(accepted)} users',
+            'import': user_import.to_dict(include_results=False)
+        }), 202, {'Location': f'/api/users/bulk/{user_import.id}'}
+    
+    # Hash the accepted passwords on the password hashing threads, leaving one free for logins
+    hashes = password_hasher.hash_many([values['password'] for values in accepted.values()])
+    
+    try:
+        insert_users([(index, values, password_hash)
+                      for (index, values), password_hash in zip(accepted.items(), hashes)], role_ids, results)
+        db.session.commit()
+    except IntegrityError:
+        # Registered by someone else since the uniqueness check
+        db.session.rollback()
+        return jsonify({'error': 'Some of these users were registered meanwhile, please retry'}), 409
+    
+    return jsonify({
+        'message': f'{len(accepted)} users created successfully',
+        'created': len(accepted),
+        'failed': len(rows) - len(accepted),
+        'results': results
+    }), 201
+
+@user_bp.route('/bulk/<int:import_id>', methods=['GET'])
+@admin_required
+def get_user_import(import_id):
+    user_import = UserImport.query.get(import_id)
+    if not user_import:
+        return jsonify({'error': 'Import not found'}), 404
+    
+    return jsonify(user_import.to_dict()), 200
+
 @user_bp.route('/<int:user_id>', methods=['PUT'])
 @jwt_required_custom
 def update_user(user_id):
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    is_admin = 'System Administrator' in current_role_names()
     
     # Only allow users to update their own profile or admins to update any profile
-    if current_user_id != user_id and not current_user.has_role('System Administrator'):
+    if current_user_id != user_id and not is_admin:
         return jsonify({'error': 'Unauthorized to update this user'}), 403
     
     user = User.query.get(user_id)
@@ -149,7 +399,7 @@ def update_user(user_id):
         user.last_name = data['last_name']
     
     # Only admins can update roles and permissions
-    if current_user.has_role('System Administrator'):
+    if is_admin:
         if 'roles' in data:
             # Clear existing roles
             user.roles = []
@@ -165,7 +415,10 @@ def update_user(user_id):
     
     # Update password if provided
     if 'password' in data:
-        user.password = data['password']
+        try:
+            user.password = data['password']
+        except PasswordHashBusy:
+            return busy_response()
     
     db.session.commit()
     
@@ -181,16 +434,40 @@ def delete_user(user_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    # Schedules the user teaches or created would go with them through ON DELETE
+    # CASCADE, unseen by delta sync; delete them here with their tombstones
+    schedules = db.session.execute(
+        select(Schedule.id, Schedule.semester_id, Schedule.day_of_week)
+        .where(or_(Schedule.instructor_id == user_id, Schedule.created_by == user_id))
+    ).all()
+    if schedules:
+        db.session.execute(delete(Schedule).where(Schedule.id.in_([schedule.id for schedule in schedules])),
+                           execution_options={'synchronize_session': False})
+        db.session.execute(insert(ScheduleDeletion), [
+            {'schedule_id': schedule.id, 'semester_id': schedule.semester_id} for schedule in schedules
+        ])
+    
+    # Their notifications and picture cannot outlive them either (user_id is NOT NULL)
+    db.session.execute(delete(Notification).where(Notification.user_id == user_id),
+                       execution_options={'synchronize_session': False})
+    db.session.execute(delete(ProfilePic).where(ProfilePic.id == user_id),
+                       execution_options={'synchronize_session': False})
+    
     db.session.delete(user)
     db.session.commit()
     
+    # Bulk statements bypass the session events, so drop the touched index buckets
+    for semester_id, day_of_week in {(schedule.semester_id, schedule.day_of_week) for schedule in schedules}:
+        schedule_index.invalidate(semester_id, day_of_week)
+    
     return jsonify({'message': 'User deleted successfully'}), 200
 
 @user_bp.route('/roles', methods=['GET'])
 @jwt_required_custom
 def get_all_roles():
-    roles = Role.query.all()
-    return jsonify([role.to_dict() for role in roles]), 200
+    roles = reference_cache.get_or_load(
+        ('roles',), lambda: [role.to_dict() for role in Role.query.all()])
+    return jsonify(roles), 200
 
 @user_bp.route('/roles', methods=['POST'])
 @admin_required
@@ -219,6 +496,7 @@ def create_role():
     
     db.session.add(new_role)
     db.session.commit()
+    reference_cache.invalidate('roles')
     
     return jsonify({
         'message': 'Role created successfully',
@@ -228,8 +506,9 @@ def create_role():
 @user_bp.route('/permissions', methods=['GET'])
 @jwt_required_custom
 def get_all_permissions():
-    permissions = Permission.query.all()
-    return jsonify([perm.to_dict() for perm in permissions]), 200
+    permissions = reference_cache.get_or_load(
+        ('permissions',), lambda: [perm.to_dict() for perm in Permission.query.all()])
+    return jsonify(permissions), 200
 
 @user_bp.route('/permissions', methods=['POST'])
 @admin_required
@@ -251,12 +530,23 @@ def create_permission():
     
     db.session.add(new_permission)
     db.session.commit()
+    reference_cache.invalidate('permissions')
     
     return jsonify({
         'message': 'Permission created successfully',
         'permission': new_permission.to_dict()
     }), 201
 
+@user_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify(reference_cache.stats()), 200
+
+@user_bp.route('/hash-stats', methods=['GET'])
+@admin_required
+def get_hash_stats():
+    return jsonify(password_hasher.stats()), 200
+
 @user_bp.route('/profile-pic/<int:user_id>', methods=['POST'])
 def upload_profile_pic(user_id):
     try:
@@ -0,0 +1,343 @@
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from threading import RLock
+import time
+
+from flask import current_app
+from sqlalchemy import literal, or_, select, union_all
+from sqlalchemy.orm import aliased
+
+from change_tracking import track_changes
+from extensions import db
+from models import Schedule
+from occupancy import interval_mask, minutes_of
+
+# Everything the conflict checks need to know about a schedule row
+ScheduleSlot = namedtuple('ScheduleSlot', [
+    'semester_id', 'day_of_week', 'lab_room_id', 'section_id',
+    'instructor_id', 'start_time', 'end_time'
+])
+
+# Conflict dimensions, in the order the checks are reported to the client
+DIMENSIONS = (
+    ('lab_room_id', 'Schedule conflict detected'),
+    ('section_id', 'Section schedule conflict detected'),
+    ('instructor_id', 'Instructor schedule conflict detected'),
+)
+
+def make_slot(semester_id, day_of_week, lab_room_id, section_id, instructor_id, start_time, end_time):
+    return ScheduleSlot(int(semester_id), day_of_week, int(lab_room_id), int(section_id),
+                        int(instructor_id), start_time, end_time)
+
+def slot_of(schedule):
+    return make_slot(schedule.semester_id, schedule.day_of_week, schedule.lab_room_id,
+                     schedule.section_id, schedule.instructor_id, schedule.start_time, schedule.end_time)
+
+
+class SlotBucket:
+    # All schedules of one (semester, day), as sorted (start, end, id) lists
+    # per (dimension, key id), each with the running maximum of its end times
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self.intervals = {}
+        self.max_ends = {}
+        self.slots = {}
+        self.room_masks = {}
+
+    def _update_max_ends(self, key, i):
+        # Recompute the running maximum end time from position i on
+        max_ends = self.max_ends.setdefault(key, [])
+        del max_ends[i:]
+        for _, end_time, _ in self.intervals[key][i:]:
+            max_ends.append(max(max_ends[-1], end_time) if max_ends else end_time)
+
+    def add(self, schedule_id, slot):
+        self.slots[schedule_id] = slot
+        self.room_masks.pop(slot.lab_room_id, None)
+        for dimension, _ in DIMENSIONS:
+            key = (dimension, getattr(slot, dimension))
+            entries = self.intervals.setdefault(key, [])
+            entry = (slot.start_time, slot.end_time, schedule_id)
+            i = bisect_left(entries, entry)
+            entries.insert(i, entry)
+            self._update_max_ends(key, i)
+
+    def remove(self, schedule_id, slot):
+        self.slots.pop(schedule_id, None)
+        self.room_masks.pop(slot.lab_room_id, None)
+        for dimension, _ in DIMENSIONS:
+            key = (dimension, getattr(slot, dimension))
+            entries = self.intervals.get(key)
+            if entries is None:
+                continue
+            entry = (slot.start_time, slot.end_time, schedule_id)
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+                self._update_max_ends(key, i)
+
+    def _overlapping_ids(self, dimension, key, start_time, end_time, exclude_id=None):
+        # Entries starting before end_time, scanned from the latest start back.
+        # Rows of one key can overlap each other (double bookings made before
+        # writes were locked), so the scan stops only once no earlier entry
+        # ends after start_time, as told by the running maximum end time
+        entries = self.intervals.get((dimension, key), [])
+        max_ends = self.max_ends.get((dimension, key), [])
+        i = bisect_left(entries, (end_time,))
+        while i > 0 and max_ends[i - 1] > start_time:
+            i -= 1
+            other_start, other_end, other_id = entries[i]
+            if other_id != exclude_id and other_end > start_time:
+                yield other_id
+
+    def overlapping(self, dimension, key, start_time, end_time, exclude_id=None):
+        return next(self._overlapping_ids(dimension, key, start_time, end_time, exclude_id), None)
+
+    def room_mask(self, lab_room_id):
+        # Occupancy bitmap of one room, rebuilt lazily after the room's entries change
+        mask = self.room_masks.get(lab_room_id)
+        if mask is None:
+            mask = 0
+            for start_time, end_time, _ in self.intervals.get(('lab_room_id', lab_room_id), []):
+                mask |= interval_mask(minutes_of(start_time), minutes_of(end_time))
+            self.room_masks[lab_room_id] = mask
+        return mask
+
+    def conflicts(self, slot, exclude_id=None):
+        # Ids of every entry overlapping slot in any dimension
+        conflict_ids = set()
+        for dimension, _ in DIMENSIONS:
+            conflict_ids.update(self._overlapping_ids(dimension, getattr(slot, dimension),
+                                                      slot.start_time, slot.end_time, exclude_id))
+        return conflict_ids
+
+    def find_conflict(self, slot, exclude_id=None):
+        for dimension, message in DIMENSIONS:
+            conflict_id = self.overlapping(dimension, getattr(slot, dimension),
+                                           slot.start_time, slot.end_time, exclude_id)
+            if conflict_id is not None:
+                return message, conflict_id
+        return None
+
+
+def _slot_rows(*criteria):
+    # Column-only query of the slots matching criteria, without flushing pending changes
+    with db.session.no_autoflush:
+        return db.session.query(
+            Schedule.id, Schedule.semester_id, Schedule.day_of_week, Schedule.lab_room_id,
+            Schedule.section_id, Schedule.instructor_id, Schedule.start_time, Schedule.end_time
+        ).filter(*criteria).all()
+
+def load_buckets(semester_ids, days):
+    # Fresh snapshot of every (semester, day) bucket in one query, for batch checks
+    buckets = defaultdict(SlotBucket)
+    for row in _slot_rows(Schedule.semester_id.in_(semester_ids), Schedule.day_of_week.in_(days)):
+        slot = make_slot(*row[1:])
+        buckets[(slot.semester_id, slot.day_of_week)].add(row.id, slot)
+    return buckets
+
+
+class ScheduleIndex:
+    def __init__(self):
+        self._lock = RLock()
+        self._buckets = {}
+        self._locations = {}
+
+    def _ttl(self):
+        return current_app.config.get('SCHEDULE_INDEX_TTL', 300)
+
+    def _bucket(self, semester_id, day_of_week):
+        key = (semester_id, day_of_week)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and time.monotonic() - bucket.loaded_at < self._ttl():
+                return bucket
+
+        # Cold (or expired) bucket: load it from the database in one query
+        rows = _slot_rows(Schedule.semester_id == semester_id, Schedule.day_of_week == day_of_week)
+
+        bucket = SlotBucket()
+        with self._lock:
+            self._drop(key)
+            for row in rows:
+                slot = make_slot(*row[1:])
+                bucket.add(row.id, slot)
+                self._locations[row.id] = slot
+            self._buckets[key] = bucket
+        return bucket
+
+    def _drop(self, key):
+        bucket = self._buckets.pop(key, None)
+        if bucket is not None:
+            for schedule_id in bucket.slots:
+                self._locations.pop(schedule_id, None)
+
+    def find_conflict(self, slot, exclude_id=None):
+        bucket = self._bucket(slot.semester_id, slot.day_of_week)
+        with self._lock:
+            return bucket.find_conflict(slot, exclude_id)
+
+    def room_masks(self, semester_id, day_of_week, lab_room_ids):
+        bucket = self._bucket(int(semester_id), day_of_week)
+        with self._lock:
+            return {lab_room_id: bucket.room_mask(lab_room_id) for lab_room_id in lab_room_ids}
+
+    def apply(self, schedule_id, slot):
+        # Keep warm buckets in sync with a committed insert/update (slot) or delete (None)
+        with self._lock:
+            old = self._locations.pop(schedule_id, None)
+            if old is not None:
+                bucket = self._buckets.get((old.semester_id, old.day_of_week))
+                if bucket is not None:
+                    bucket.remove(schedule_id, old)
+
+            if slot is None:
+                return
+            bucket = self._buckets.get((slot.semester_id, slot.day_of_week))
+            if bucket is not None:
+                bucket.add(schedule_id, slot)
+                self._locations[schedule_id] = slot
+
+    def invalidate(self, semester_id=None, day_of_week=None):
+        with self._lock:
+            for key in list(self._buckets):
+                if semester_id is not None and key[0] != semester_id:
+                    continue
+                if day_of_week is not None and key[1] != day_of_week:
+                    continue
+                self._drop(key)
+
+
+schedule_index = ScheduleIndex()
+
+def query_conflict(slot, exclude_id=None):
+    # One statement for all three checks: each branch is a range scan on its
+    # composite index, and the branch priority keeps the reporting order
+    branches = []
+    for priority, (dimension, _) in enumerate(DIMENSIONS):
+        branch = select(
+            literal(priority).label('priority'),
+            Schedule.id.label('schedule_id')
+        ).where(
+            Schedule.semester_id == slot.semester_id,
+            Schedule.day_of_week == slot.day_of_week,
+            getattr(Schedule, dimension) == getattr(slot, dimension),
+            Schedule.start_time < slot.end_time,
+            Schedule.end_time > slot.start_time
+        )
+        if exclude_id is not None:
+            branch = branch.where(Schedule.id != exclude_id)
+        branches.append(branch.limit(1).subquery().select())
+
+    conflicts = union_all(*branches).subquery()
+    with db.session.no_autoflush:
+        row = db.session.execute(
+            select(conflicts).order_by(conflicts.c.priority).limit(1)
+        ).first()
+
+    if row is None:
+        return None
+    return DIMENSIONS[row.priority][1], row.schedule_id
+
+def query_conflict_pairs(semester_ids, after_id=None, ids=None, limit=20):
+    # Set-based check after a bulk write: overlapping pairs within the semesters
+    # where at least one side was written, i.e. has an id above after_id or in ids.
+    # Returns (message, schedule_id, conflicting_schedule_id) tuples.
+    written, other = aliased(Schedule), aliased(Schedule)
+    if ids is not None:
+        is_written = written.id.in_(ids)
+        # Pairs of two written rows are reported once
+        once = or_(other.id.notin_(ids), other.id < written.id)
+    else:
+        is_written = written.id > after_id
+        once = or_(other.id <= after_id, other.id < written.id)
+
+    branches = []
+    for priority, (dimension, _) in enumerate(DIMENSIONS):
+        branches.append(select(
+            literal(priority).label('priority'),
+            written.id.label('schedule_id'),
+            other.id.label('conflicting_schedule_id')
+        ).where(
+            written.semester_id.in_(semester_ids),
+            is_written,
+            other.semester_id == written.semester_id,
+            other.day_of_week == written.day_of_week,
+            getattr(other, dimension) == getattr(written, dimension),
+            other.start_time < written.end_time,
+            other.end_time > written.start_time,
+            other.id != written.id,
+            once
+        ))
+
+    pairs = union_all(*branches).subquery()
+    rows = db.session.execute(
+        select(pairs)
+        .order_by(pairs.c.schedule_id, pairs.c.conflicting_schedule_id, pairs.c.priority)
+        .limit(limit * len(DIMENSIONS))
+    ).all()
+
+    conflicts = {}
+    for row in rows:
+        key = (row.schedule_id, row.conflicting_schedule_id)
+        if key not in conflicts:
+            conflicts[key] = DIMENSIONS[row.priority][1]
+            if len(conflicts) == limit:
+                break
+    return [(message, schedule_id, conflicting_id) for (schedule_id, conflicting_id), message in conflicts.items()]
+
+def room_masks(semester_id, day_of_week, lab_room_ids):
+    # Occupancy bitmaps of the rooms on one day, from the index or, with the
+    # index disabled, from a fresh query
+    if current_app.config.get('SCHEDULE_INDEX_ENABLED', True):
+        return schedule_index.room_masks(semester_id, day_of_week, lab_room_ids)
+    bucket = load_buckets({int(semester_id)}, {day_of_week})[(int(semester_id), day_of_week)]
+    return {lab_room_id: bucket.room_mask(lab_room_id) for lab_room_id in lab_room_ids}
+
+def _still_conflicts(slot, schedule, message):
+    # Whether the row behind an index hit still clashes with slot the way the
+    # index says, as another worker may have moved it since the bucket was loaded
+    dimension = next(dimension for dimension, text in DIMENSIONS if text == message)
+    return (schedule.semester_id == slot.semester_id
+            and schedule.day_of_week == slot.day_of_week
+            and getattr(schedule, dimension) == getattr(slot, dimension)
+            and schedule.start_time < slot.end_time
+            and schedule.end_time > slot.start_time)
+
+def find_conflicting_schedule(slot, exclude_id=None):
+    if current_app.config.get('SCHEDULE_INDEX_ENABLED', True):
+        conflict = schedule_index.find_conflict(slot, exclude_id)
+        if conflict is None:
+            return None
+
+        message, conflict_id = conflict
+        schedule = Schedule.query.get(conflict_id)
+        if schedule is not None and _still_conflicts(slot, schedule, message):
+            return message, schedule
+
+        # The row was moved or deleted by another worker: reload the bucket and
+        # let the database decide
+        schedule_index.invalidate(slot.semester_id, slot.day_of_week)
+
+    conflict = query_conflict(slot, exclude_id)
+    if conflict is None:
+        return None
+    message, conflict_id = conflict
+    return message, Schedule.query.get(conflict_id)
+
+
+# Track schedule writes per session and apply them to the index once committed
+def _collect_schedule_changes(changes, session):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Schedule):
+            changes[obj.id] = slot_of(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Schedule):
+            changes[obj.id] = None
+
+def _apply_schedule_changes(changes):
+    for schedule_id, slot in changes.items():
+        schedule_index.apply(schedule_id, slot)
+
+track_changes('schedule_changes', on_flush=_collect_schedule_changes,
+              on_commit=_apply_schedule_changes, factory=dict)
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import insert, tuple_, update
+
+from change_tracking import pending_changes, track_changes
+from extensions import db
+from models import ScheduleLock
+from schedule_index import DIMENSIONS
+
+def lock_keys(slots):
+    # Every (semester, day, dimension, key) a set of slots can conflict on, in
+    # one global order so that concurrent writers never deadlock
+    return sorted({(slot.semester_id, slot.day_of_week, dimension, getattr(slot, dimension))
+                   for slot in slots for dimension, _ in DIMENSIONS})
+
+def _insert_ignore():
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return insert(ScheduleLock).prefix_with('OR IGNORE')
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(ScheduleLock).on_conflict_do_nothing()
+    return insert(ScheduleLock).prefix_with('IGNORE')
+
+def _acquire(keys):
+    # Row locks held until the session commits or rolls back; touching the rows
+    # locks them on MySQL and takes the write lock on SQLite
+    columns = tuple_(ScheduleLock.semester_id, ScheduleLock.day_of_week,
+                     ScheduleLock.dimension, ScheduleLock.key_id)
+    return db.session.execute(
+        update(ScheduleLock).where(columns.in_(keys)).values(locked_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+# Whether the session's current transaction has written anything besides lock rows
+def _note_write(written, *args):
+    written.add(True)
+
+def _note_bulk_write(written, table, orm_execute_state):
+    if table != ScheduleLock.__tablename__:
+        written.add(True)
+
+track_changes('schedule_locks.written', on_flush=_note_write, on_bulk=_note_bulk_write)
+
+class UnlockedChanges(RuntimeError):
+    pass
+
+def lock_slots(slots):
+    # Serialize writers per (semester, day, room/section/instructor): writes to
+    # different rooms, sections and instructors proceed in parallel. This starts
+    # a new transaction, so it must run before the caller changes anything; the
+    # conflict check that follows then reads everything committed by previous
+    # holders (InnoDB snapshots begin at the first plain read).
+    session = db.session()
+    if session.new or session.dirty or session.deleted or pending_changes(session, 'schedule_locks.written'):
+        raise UnlockedChanges('Slot locks must be taken before changing anything in the session')
+    keys = lock_keys(slots)
+    db.session.rollback()
+    if not keys or _acquire(keys) == len(keys):
+        return
+
+    # First write to some of these keys: create their rows in a short
+    # transaction of their own, then lock the whole set again in order
+    db.session.rollback()
+    with db.engine.begin() as connection:
+        connection.execute(_insert_ignore(), [
+            {'semester_id': semester_id, 'day_of_week': day_of_week, 'dimension': dimension, 'key_id': key_id}
+            for semester_id, day_of_week, dimension, key_id in keys
+        ])
+    _acquire(keys)
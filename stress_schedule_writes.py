@@ -0,0 +1,112 @@
+import requests
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:5000/api"
+
+# Concurrent writers and total create requests; with few rooms and time slots
+# most requests race for a slot somebody else is booking at the same moment
+WORKERS = 16
+REQUESTS = 400
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SLOTS = [("08:00", "10:00"), ("09:00", "11:00"), ("10:00", "12:00"), ("13:00", "15:00"), ("15:00", "17:00")]
+
+def login(id_or_email, password):
+    response = requests.post(f"{BASE_URL}/auth/login", json={"id_or_email": id_or_email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_semester(headers):
+    response = requests.post(f"{BASE_URL}/schedules/semesters", headers=headers, json={
+        "name": f"Stress Test {int(time.time())}",
+        "school_year": "0000-0000",
+        "start_date": "2000-01-03",
+        "end_date": "2000-05-31",
+        "is_active": False
+    })
+    response.raise_for_status()
+    return response.json()["semester"]["id"]
+
+def overlapping(schedules, key):
+    # Pairs of schedules on the same day and key whose times overlap
+    pairs = []
+    groups = {}
+    for schedule in schedules:
+        groups.setdefault((schedule["day_of_week"], key(schedule)), []).append(schedule)
+    for group in groups.values():
+        group.sort(key=lambda schedule: schedule["start_time"])
+        for previous, current in zip(group, group[1:]):
+            if current["start_time"] < previous["end_time"]:
+                pairs.append((previous["id"], current["id"]))
+    return pairs
+
+def main():
+    print("=== Schedule Write Stress Test ===\n")
+
+    headers = login("admin@uic.edu.ph", "admin123")
+    courses = requests.get(f"{BASE_URL}/schedules/courses", headers=headers).json()
+    sections = requests.get(f"{BASE_URL}/schedules/sections", headers=headers).json()
+    lab_rooms = requests.get(f"{BASE_URL}/schedules/lab-rooms", headers=headers).json()
+    instructors = requests.get(f"{BASE_URL}/users/", headers=headers, params={"role": "Faculty/Staff"}).json()
+
+    if not (courses and sections and lab_rooms and instructors):
+        print("Needs at least one course, section, lab room and Faculty/Staff user.")
+        return
+
+    semester_id = create_semester(headers)
+    print(f"Writing into new semester {semester_id} with {WORKERS} workers, {REQUESTS} requests\n")
+
+    random.seed(42)
+    payloads = []
+    for _ in range(REQUESTS):
+        start_time, end_time = random.choice(SLOTS)
+        payloads.append({
+            "semester_id": semester_id,
+            "course_id": random.choice(courses)["id"],
+            "section_id": random.choice(sections)["id"],
+            "lab_room_id": random.choice(lab_rooms)["id"],
+            "instructor_id": random.choice(instructors)["id"],
+            "day_of_week": random.choice(DAYS),
+            "start_time": start_time,
+            "end_time": end_time,
+            "is_lab": True
+        })
+
+    session = requests.Session()
+    session.headers.update(headers)
+
+    def create(payload):
+        return session.post(f"{BASE_URL}/schedules/", json=payload).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        status_codes = list(executor.map(create, payloads))
+    elapsed = time.perf_counter() - started
+
+    created = status_codes.count(201)
+    rejected = status_codes.count(409)
+    errors = len(status_codes) - created - rejected
+
+    # Every accepted write must still be conflict-free
+    schedules = requests.get(f"{BASE_URL}/schedules/", headers=headers, params={"semester_id": semester_id}).json()
+    double_bookings = {
+        "lab room": overlapping(schedules, lambda schedule: schedule["lab_room"]["id"]),
+        "section": overlapping(schedules, lambda schedule: schedule["section"]["id"]),
+        "instructor": overlapping(schedules, lambda schedule: schedule["instructor"]["id"]),
+    }
+
+    print(f"  Created: {created}, rejected as conflicts: {rejected}, errors: {errors}")
+    print(f"  Elapsed: {elapsed:.2f}s, {len(status_codes) / elapsed:.1f} requests/s, {created / elapsed:.1f} writes/s")
+    for dimension, pairs in double_bookings.items():
+        print(f"  {dimension.capitalize()} double bookings: {len(pairs)}" + (f" {pairs[:5]}" if pairs else ""))
+    print()
+
+    # Remove the test schedules (the empty, inactive semester is left behind)
+    requests.delete(f"{BASE_URL}/schedules/bulk", headers=headers, json={"filter": {"semester_id": semester_id}})
+
+    passed = errors == 0 and not any(double_bookings.values()) and len(schedules) == created
+    print(f"Stress test {'passed' if passed else 'FAILED'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fieldsets import parse_fields, pick
+
+ALLOWED = ('id', 'start_time', 'lab_room', 'course')
+NESTED = {'lab_room': ('id', 'name'), 'course': ('id', 'code')}
+
+
+class ParseFieldsTest(unittest.TestCase):
+    def test_absent_parameter_means_every_field(self):
+        self.assertIsNone(parse_fields({}, ALLOWED, NESTED))
+
+    def test_top_level_and_nested_fields(self):
+        self.assertEqual(parse_fields({'fields': 'id, start_time,lab_room.name,lab_room.id'}, ALLOWED, NESTED),
+                         {'id': None, 'start_time': None, 'lab_room': {'name', 'id'}})
+
+    def test_whole_record_wins_over_its_subfields(self):
+        for value in ('course,course.code', 'course.code,course'):
+            self.assertEqual(parse_fields({'fields': value}, ALLOWED, NESTED), {'course': None})
+
+    def test_unknown_field_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown field: password'):
+            parse_fields({'fields': 'id,password'}, ALLOWED, NESTED)
+
+    def test_unknown_nested_field_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown field: lab_room.capacity'):
+            parse_fields({'fields': 'lab_room.capacity'}, ALLOWED, NESTED)
+        with self.assertRaisesRegex(ValueError, 'Unknown field: id.value'):
+            parse_fields({'fields': 'id.value'}, ALLOWED, NESTED)
+
+    def test_empty_list_is_rejected(self):
+        for value in ('', ' , ,'):
+            with self.assertRaisesRegex(ValueError, 'at least one field'):
+                parse_fields({'fields': value}, ALLOWED, NESTED)
+
+    def test_pick(self):
+        data = {'id': 1, 'start_time': '08:00', 'course': {}}
+        self.assertIs(pick(data, None), data)
+        self.assertEqual(pick(data, {'id': None}), {'id': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
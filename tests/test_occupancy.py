@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from occupancy import SLOT_MINUTES, free_windows, interval_mask
+
+DAY = (7 * 60, 21 * 60)
+
+
+def hours(start, end):
+    return interval_mask(int(start * 60), int(end * 60))
+
+
+class FreeWindowsTest(unittest.TestCase):
+    def test_empty_day_is_one_window(self):
+        self.assertEqual(free_windows(0, 60, *DAY), [DAY])
+
+    def test_gaps_between_bookings(self):
+        occupied = hours(8, 10) | hours(12, 13)
+
+        self.assertEqual(free_windows(occupied, 60, *DAY),
+                         [(7 * 60, 8 * 60), (10 * 60, 12 * 60), (13 * 60, 21 * 60)])
+
+    def test_windows_shorter_than_the_duration_are_dropped(self):
+        occupied = hours(8, 10) | hours(11, 13)
+
+        self.assertEqual(free_windows(occupied, 90, *DAY), [(13 * 60, 21 * 60)])
+        self.assertIn((10 * 60, 11 * 60), free_windows(occupied, 60, *DAY))
+
+    def test_partially_used_slots_count_as_taken(self):
+        occupied = interval_mask(8 * 60 + 5, 9 * 60 + 50)
+
+        self.assertEqual(free_windows(occupied, SLOT_MINUTES, 8 * 60, 11 * 60),
+                         [(10 * 60, 11 * 60)])
+
+    def test_window_bounds_are_rounded_inwards(self):
+        self.assertEqual(free_windows(0, SLOT_MINUTES, 8 * 60 + 5, 9 * 60 + 10),
+                         [(8 * 60 + 15, 9 * 60)])
+
+    def test_fully_booked_or_empty_range_has_no_windows(self):
+        self.assertEqual(free_windows(hours(7, 21), 15, *DAY), [])
+        self.assertEqual(free_windows(0, 15, 9 * 60, 9 * 60), [])
+        self.assertEqual(free_windows(0, 15, 9 * 60 + 5, 9 * 60 + 10), [])
+
+    def test_whole_day(self):
+        self.assertEqual(free_windows(hours(0, 1) | hours(23, 24), 60, 0, 24 * 60), [(60, 23 * 60)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import unittest
+from datetime import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule_index import SlotBucket, make_slot
+
+
+def room_slot(start, end, lab_room_id=1, section_id=None, instructor_id=None):
+    # Section and instructor default to ones no other slot shares, so only the room can clash
+    section_id = section_id or start * 100 + end
+    instructor_id = instructor_id or start * 100 + end
+    return make_slot(1, 'Monday', lab_room_id, section_id, instructor_id, time(start), time(end))
+
+
+class SlotBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.bucket = SlotBucket()
+
+    def add(self, schedule_id, *args, **kwargs):
+        slot = room_slot(*args, **kwargs)
+        self.bucket.add(schedule_id, slot)
+        return slot
+
+    def test_finds_overlap_in_each_dimension(self):
+        self.add(1, 8, 10, lab_room_id=1, section_id=1, instructor_id=1)
+
+        self.assertEqual(self.bucket.find_conflict(room_slot(9, 11, lab_room_id=1)),
+                         ('Schedule conflict detected', 1))
+        self.assertEqual(self.bucket.find_conflict(room_slot(9, 11, lab_room_id=2, section_id=1)),
+                         ('Section schedule conflict detected', 1))
+        self.assertEqual(self.bucket.find_conflict(room_slot(9, 11, lab_room_id=2, instructor_id=1)),
+                         ('Instructor schedule conflict detected', 1))
+        self.assertIsNone(self.bucket.find_conflict(room_slot(9, 11, lab_room_id=2)))
+
+    def test_touching_intervals_do_not_conflict(self):
+        self.add(1, 8, 10)
+
+        self.assertIsNone(self.bucket.find_conflict(room_slot(10, 12)))
+        self.assertIsNone(self.bucket.find_conflict(room_slot(6, 8)))
+        self.assertEqual(self.bucket.conflicts(room_slot(10, 12)), set())
+
+    def test_nested_booking_is_found(self):
+        self.add(1, 8, 16)
+        self.add(2, 9, 10)
+
+        # Starts after the short nested booking ended, inside the long one
+        self.assertEqual(self.bucket.conflicts(room_slot(11, 12)), {1})
+        self.assertEqual(self.bucket.conflicts(room_slot(9, 10)), {1, 2})
+
+    def test_long_booking_is_found_behind_many_later_starts(self):
+        # An earlier double booking spans the whole day; every later entry ends
+        # before the probe starts, so only the running maximum reaches back to it
+        self.add(1, 7, 21)
+        for schedule_id, start in enumerate(range(8, 18), start=2):
+            self.add(schedule_id, start, start + 1)
+
+        self.assertEqual(self.bucket.conflicts(room_slot(19, 20)), {1})
+        self.assertEqual(self.bucket.find_conflict(room_slot(19, 20)), ('Schedule conflict detected', 1))
+
+    def test_exclude_id_skips_the_schedule_itself(self):
+        self.add(1, 8, 10)
+
+        self.assertIsNone(self.bucket.find_conflict(room_slot(8, 10), exclude_id=1))
+        self.assertEqual(self.bucket.conflicts(room_slot(8, 10), exclude_id=1), set())
+
+    def test_removal_is_reflected_in_later_scans(self):
+        long_booking = self.add(1, 7, 21)
+        self.add(2, 8, 9)
+        self.add(3, 12, 13)
+
+        self.bucket.remove(1, long_booking)
+
+        self.assertIsNone(self.bucket.find_conflict(room_slot(19, 20)))
+        self.assertEqual(self.bucket.conflicts(room_slot(8, 13)), {2, 3})
+        self.assertEqual(self.bucket.conflicts(room_slot(10, 12)), set())
+
+    def test_removing_an_unknown_slot_changes_nothing(self):
+        self.add(1, 8, 10)
+
+        self.bucket.remove(2, room_slot(8, 10))
+        self.bucket.remove(3, room_slot(8, 10, lab_room_id=5))
+
+        self.assertEqual(self.bucket.conflicts(room_slot(9, 11)), {1})
+
+
+if __name__ == '__main__':
+    unittest.main()
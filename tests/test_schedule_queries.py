@@ -0,0 +1,100 @@
+import os
+import sys
+import unittest
+from datetime import date, time, timedelta
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db, jwt
+from models import User, Role, Semester, Course, Section, LabRoom, Schedule
+from auth_claims import role_claims
+from cache import reference_cache
+from routes.schedule_routes import schedule_bp
+
+# Most statements GET /api/schedules/ and /<id> may run, whatever the row count
+QUERY_BUDGET = 9
+
+
+class ScheduleQueryBudgetTest(unittest.TestCase):
+    # The schedule endpoints load related records in a fixed number of
+    # queries; lazy loads per schedule would make the count grow with the rows
+    def setUp(self):
+        reference_cache.clear()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['JWT_SECRET_KEY'] = 'test-secret'
+        self.app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+        db.init_app(self.app)
+        jwt.init_app(self.app)
+        self.app.register_blueprint(schedule_bp, url_prefix='/api/schedules')
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            admin = User(email='admin@example.com', student_id='A1', first_name='Ad', last_name='Min',
+                         password_hash='x', roles=[Role(name='System Administrator')])
+            db.session.add(admin)
+            db.session.add(Semester(name='1st', school_year='2026-2027',
+                                    start_date=date(2026, 8, 1), end_date=date(2026, 12, 15)))
+            db.session.commit()
+            self.headers = {'Authorization': 'Bearer ' + create_access_token(
+                identity=admin.id, additional_claims=role_claims(admin))}
+
+            self.statements = []
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *args: self.statements.append(args[2]))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_schedules(self, count):
+        # Every schedule gets its own course, section, room and instructor, so
+        # loading any of them per row would show up in the count
+        with self.app.app_context():
+            start = Schedule.query.count()
+            for i in range(start, start + count):
+                instructor = User(email=f'faculty{i}@example.com', student_id=f'F{i}',
+                                  first_name='Fac', last_name=str(i), password_hash='x')
+                course = Course(code=f'CS{i}', name=f'Course {i}', units=3)
+                section = Section(name=f'S{i}', program='BSCS', year_level=1)
+                lab_room = LabRoom(name=f'Lab {i}', capacity=30)
+                db.session.add(Schedule(
+                    semester_id=1, course=course, section=section, lab_room=lab_room,
+                    instructor=instructor, creator=instructor, day_of_week='Monday',
+                    start_time=time(8), end_time=time(10), is_lab=True))
+            db.session.commit()
+
+    def count_queries(self, url):
+        self.statements.clear()
+        response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return len(self.statements)
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.add_schedules(1)
+        one = self.count_queries('/api/schedules/')
+        self.add_schedules(24)
+        many = self.count_queries('/api/schedules/')
+
+        self.assertEqual(one, many)
+        self.assertLessEqual(many, QUERY_BUDGET)
+
+    def test_detail_query_count_does_not_grow_with_rows(self):
+        self.add_schedules(1)
+        one = self.count_queries('/api/schedules/1')
+        self.add_schedules(24)
+        many = self.count_queries('/api/schedules/25')
+
+        self.assertEqual(one, many)
+        self.assertLessEqual(many, QUERY_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+from threading import RLock
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from change_tracking import track_changes
+from extensions import db
+from models import Schedule, Course, Section, LabRoom, User
+from occupancy import minutes_of
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Grid kind in the URL -> Schedule column it groups by
+GRID_KINDS = {
+    'section': 'section_id',
+    'lab-room': 'lab_room_id',
+}
+
+# Tables whose changes can alter any grid's schedule summaries
+GRID_TABLES = {'courses', 'sections', 'lab_rooms', 'users'}
+
+# Rows always span at least this window (minutes); it grows to fit earlier or later classes
+GRID_WINDOW = (7 * 60, 21 * 60)
+
+# Largest row height that still puts every class boundary on a row edge
+SLOT_CHOICES = (30, 15, 5, 1)
+
+
+def _summary_rows(*criteria):
+    with db.session.no_autoflush:
+        return db.session.execute(
+            select(
+                Schedule.id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time, Schedule.is_lab,
+                Course.code, Course.name, Section.program, Section.name, LabRoom.name,
+                User.first_name, User.last_name
+            ).join(Course, Schedule.course_id == Course.id)
+             .join(Section, Schedule.section_id == Section.id)
+             .join(LabRoom, Schedule.lab_room_id == LabRoom.id)
+             .join(User, Schedule.instructor_id == User.id)
+             .where(*criteria)
+        ).all()
+
+def _entry(row):
+    (schedule_id, day_of_week, start_time, end_time, is_lab, course_code, course_name,
+     program, section_name, lab_room_name, first_name, last_name) = row
+    return day_of_week, minutes_of(start_time), minutes_of(end_time), {
+        'schedule_id': schedule_id,
+        'course_code': course_code,
+        'course_name': course_name,
+        'section': f'{program}-{section_name}',
+        'lab_room': lab_room_name,
+        'instructor': f'{first_name} {last_name}',
+        'start_time': start_time.strftime('%H:%M'),
+        'end_time': end_time.strftime('%H:%M'),
+        'is_lab': is_lab
+    }
+
+def render_grid(kind, semester_id, record_id, entries):
+    # Day x time-slot table: the first slot of a class holds its id and rowspan,
+    # the slots it continues into are marked covered, free slots are null
+    entries = [entry for entry in entries if entry[0] in WEEKDAYS]
+    days = WEEKDAYS[:6] + (['Sunday'] if any(entry[0] == 'Sunday' for entry in entries) else [])
+    boundaries = [minutes for entry in entries for minutes in entry[1:3]]
+
+    slot = next(size for size in SLOT_CHOICES if all(minutes % size == 0 for minutes in boundaries))
+    first = min([GRID_WINDOW[0]] + boundaries) // slot * slot
+    last = -(-max([GRID_WINDOW[1]] + boundaries) // slot) * slot
+    slot_count = (last - first) // slot
+
+    cells = {day: [None] * slot_count for day in days}
+    for day_of_week, start, end, summary in sorted(entries, key=lambda entry: (entry[1], entry[2])):
+        begin = (start - first) // slot
+        span = (end - start) // slot
+        column = cells[day_of_week]
+        column[begin] = {'schedule_id': summary['schedule_id'], 'rowspan': span}
+        for i in range(begin + 1, begin + span):
+            column[i] = {'schedule_id': summary['schedule_id'], 'covered': True}
+
+    def clock(minutes):
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+    return {
+        'kind': kind,
+        'semester_id': semester_id,
+        'id': record_id,
+        'slot_minutes': slot,
+        'days': days,
+        'rows': [{
+            'start_time': clock(first + i * slot),
+            'end_time': clock(first + (i + 1) * slot),
+            'cells': [cells[day][i] for day in days]
+        } for i in range(slot_count)],
+        'schedules': {str(summary['schedule_id']): summary for _, _, _, summary in entries}
+    }
+
+
+class TimetableGrids:
+    # Materialized weekly grids keyed by (kind, semester_id, record_id). Each
+    # holds per-schedule summaries; a committed schedule write marks its ids
+    # pending in the affected grids and only those rows are re-read on the
+    # next request, after which the JSON is rendered again.
+    def __init__(self):
+        self._lock = RLock()
+        self._grids = {}
+        self._locations = {}
+        self._writes = 0
+
+    def _ttl(self):
+        return current_app.config.get('TIMETABLE_GRID_TTL', 300)
+
+    def _criteria(self, key):
+        kind, semester_id, record_id = key
+        return [Schedule.semester_id == semester_id, getattr(Schedule, GRID_KINDS[kind]) == record_id]
+
+    def _drop(self, key):
+        grid = self._grids.pop(key, None)
+        if grid is not None:
+            for schedule_id in grid['entries']:
+                keys = self._locations.get(schedule_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._locations[schedule_id]
+
+    def _store(self, key, grid, rows, replaced=()):
+        for schedule_id in replaced:
+            grid['entries'].pop(schedule_id, None)
+            keys = self._locations.get(schedule_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._locations[schedule_id]
+        for row in rows:
+            grid['entries'][row.id] = _entry(row)
+            self._locations.setdefault(row.id, set()).add(key)
+        grid['rendered'] = None
+
+    def get(self, kind, semester_id, record_id):
+        key = (kind, semester_id, record_id)
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is not None and time.monotonic() - grid['loaded_at'] > self._ttl():
+                self._drop(key)
+                grid = None
+            writes = self._writes
+
+        if grid is None:
+            # Full load of one grid in a single joined query
+            rows = _summary_rows(*self._criteria(key))
+            with self._lock:
+                if self._writes != writes:
+                    # A write landed while loading; serve this copy without keeping it
+                    return render_grid(kind, semester_id, record_id, [_entry(row) for row in rows])
+                grid = {'loaded_at': time.monotonic(), 'entries': {}, 'pending': set(), 'rendered': None}
+                self._store(key, grid, rows)
+                self._grids[key] = grid
+
+        with self._lock:
+            pending, grid['pending'] = grid['pending'], set()
+
+        if pending:
+            # Incremental refresh: re-read only the schedules written since the last render
+            rows = _summary_rows(Schedule.id.in_(pending), *self._criteria(key))
+            with self._lock:
+                if self._grids.get(key) is grid:
+                    self._store(key, grid, rows, pending)
+
+        with self._lock:
+            if grid['rendered'] is None:
+                grid['rendered'] = render_grid(kind, semester_id, record_id, list(grid['entries'].values()))
+            return grid['rendered']
+
+    def apply(self, changes):
+        # changes: schedule id -> grid keys it belongs to after a committed write
+        with self._lock:
+            self._writes += 1
+            for schedule_id, keys in changes.items():
+                for key in self._locations.get(schedule_id, set()) | keys:
+                    grid = self._grids.get(key)
+                    if grid is not None:
+                        grid['pending'].add(schedule_id)
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._grids.clear()
+            self._locations.clear()
+
+
+timetable_grids = TimetableGrids()
+
+def grid_keys(schedule):
+    return {(kind, schedule.semester_id, getattr(schedule, column)) for kind, column in GRID_KINDS.items()}
+
+
+# Track schedule writes per session and mark the affected grids once committed
+def _collect_grid_changes(changes, session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Schedule):
+            changes[obj.id] = set() if obj in session.deleted else grid_keys(obj)
+        elif getattr(obj, '__tablename__', None) in GRID_TABLES:
+            changes['*'] = set()
+
+def _collect_bulk_grid_changes(changes, table, orm_execute_state):
+    # Bulk statements do not say which rows they touched, so every grid is rebuilt
+    if table in GRID_TABLES | {'schedules'}:
+        changes['*'] = set()
+
+def _apply_grid_changes(changes):
+    if '*' in changes:
+        timetable_grids.clear()
+    else:
+        timetable_grids.apply(changes)
+
+track_changes('grid_changes', on_flush=_collect_grid_changes, on_bulk=_collect_bulk_grid_changes,
+              on_commit=_apply_grid_changes, factory=dict)
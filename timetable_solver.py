@@ -0,0 +1,245 @@
+from collections import defaultdict, namedtuple
+from datetime import time as clock
+import random
+import time
+
+from schedule_index import SlotBucket, make_slot
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DEFAULT_DAYS = WEEKDAYS[:5]
+DEFAULT_WINDOW = (7 * 60, 19 * 60)
+
+# One weekly meeting of a demand, and one place/time it could go
+Session = namedtuple('Session', ['demand_index', 'minutes'])
+Placement = namedtuple('Placement', ['day_of_week', 'start', 'lab_room_id', 'instructor_id'])
+
+def to_minutes(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+def to_clock(minutes):
+    return clock(minutes // 60, minutes % 60)
+
+
+class Candidates:
+    # Placements of one session, cheapest first (see TimetableSolver._cost),
+    # spreading equal costs over days and rooms. Built on demand: instructors
+    # x starts x days x rooms runs into the millions with short steps.
+    def __init__(self, instructors, starts, days, rooms):
+        self.instructors = instructors
+        self.starts = starts
+        self.days = days
+        self.rooms = rooms
+
+    def __len__(self):
+        return len(self.instructors) * len(self.starts) * len(self.days) * len(self.rooms)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        i, room = divmod(i, len(self.rooms))
+        i, day = divmod(i, len(self.days))
+        instructor, start = divmod(i, len(self.starts))
+        return Placement(self.days[day], self.starts[start], self.rooms[room], self.instructors[instructor])
+
+    def __iter__(self):
+        for instructor_id in self.instructors:
+            for start in self.starts:
+                for day in self.days:
+                    for room_id in self.rooms:
+                        yield Placement(day, start, room_id, instructor_id)
+
+
+class TimetableSolver:
+    # Assigns lab rooms and time slots to course-section demands without room,
+    # section or instructor clashes, using the same overlap rules (SlotBucket)
+    # as create_schedule. Greedy construction, most constrained session first,
+    # followed by min-conflicts repair and instructor-preference improvement
+    # until the time budget runs out.
+    def __init__(self, semester_id, demands, rooms, buckets=None, step_minutes=30, seed=None, max_sessions=None):
+        self.semester_id = int(semester_id)
+        self.demands = demands
+        self.rooms = rooms
+        self.buckets = buckets if buckets is not None else defaultdict(SlotBucket)
+        self.step = step_minutes
+        self.random = random.Random(seed)
+        self.deadline = None
+
+        meetings = []
+        for index, demand in enumerate(demands):
+            total = round(float(demand['hours_per_week']) * 60)
+            length = round(float(demand.get('session_hours') or demand['hours_per_week']) * 60)
+            if length <= 0 or total <= 0 or total % length:
+                raise ValueError(f'Demand {index}: hours_per_week must be a positive multiple of session_hours')
+            meetings.append((index, length, total // length))
+        if max_sessions is not None and sum(count for _, _, count in meetings) > max_sessions:
+            raise ValueError(f'At most {max_sessions} sessions can be generated at once')
+        self.sessions = [Session(index, length) for index, length, count in meetings for _ in range(count)]
+
+        # Sessions of one demand share their candidate placements
+        shared = {session: self._candidates(session) for session in set(self.sessions)}
+        self.candidates = [shared[session] for session in self.sessions]
+        self.assigned = {}
+        self.demand_days = defaultdict(set)
+
+    def _candidates(self, session):
+        demand = self.demands[session.demand_index]
+        days = demand.get('days') or DEFAULT_DAYS
+        windows = [(to_minutes(w['start']), to_minutes(w['end'])) for w in demand.get('windows') or []]
+        windows = windows or [DEFAULT_WINDOW]
+        room_ids = set(demand.get('lab_room_ids') or [])
+        min_capacity = demand.get('min_capacity') or 0
+        rooms = [room_id for room_id, capacity in self.rooms
+                 if (not room_ids or room_id in room_ids) and capacity >= min_capacity]
+        instructors = list(dict.fromkeys([int(demand['instructor_id'])] + [
+            int(i) for i in demand.get('alternate_instructor_ids') or []]))
+
+        starts = sorted({start for window_start, window_end in windows
+                         for start in range(window_start, window_end - session.minutes + 1, self.step)})
+
+        return Candidates(instructors, starts, list(days), rooms)
+
+    def _slot(self, session, placement):
+        demand = self.demands[session.demand_index]
+        return make_slot(self.semester_id, placement.day_of_week, placement.lab_room_id,
+                         demand['section_id'], placement.instructor_id,
+                         to_clock(placement.start), to_clock(placement.start + session.minutes))
+
+    def _cost(self, session, placement):
+        # Prefer the requested instructor, then earlier start times
+        demand = self.demands[session.demand_index]
+        return (placement.instructor_id != int(demand['instructor_id']), placement.start)
+
+    def _day_taken(self, index, placement):
+        # Meetings of the same demand go on different days
+        return placement.day_of_week in self.demand_days[self.sessions[index].demand_index]
+
+    def _place(self, index, placement):
+        session = self.sessions[index]
+        slot = self._slot(session, placement)
+        self.buckets[(slot.semester_id, slot.day_of_week)].add(-(index + 1), slot)
+        self.demand_days[session.demand_index].add(placement.day_of_week)
+        self.assigned[index] = placement
+
+    def _unplace(self, index):
+        session = self.sessions[index]
+        placement = self.assigned.pop(index)
+        slot = self._slot(session, placement)
+        self.buckets[(slot.semester_id, slot.day_of_week)].remove(-(index + 1), slot)
+        self.demand_days[session.demand_index].discard(placement.day_of_week)
+
+    def _conflicts(self, index, placement):
+        slot = self._slot(self.sessions[index], placement)
+        return self.buckets[(slot.semester_id, slot.day_of_week)].conflicts(slot)
+
+    def _feasible(self, index, placement):
+        return not self._day_taken(index, placement) and not self._conflicts(index, placement)
+
+    def _out_of_time(self, count):
+        # Checked every few hundred candidates, to keep the clock reads cheap
+        return count % 256 == 0 and self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _place_best(self, index):
+        for count, placement in enumerate(self.candidates[index]):
+            if self._out_of_time(count):
+                return False
+            if self._feasible(index, placement):
+                self._place(index, placement)
+                return True
+        return False
+
+    def _repair(self, index):
+        # Min-conflicts move: place the session where it only clashes with other
+        # generated sessions (never with existing schedules), bump those and try
+        # to put them back elsewhere. Kept only if nothing is lost overall.
+        placement = self.random.choice(self.candidates[index])
+        if self._day_taken(index, placement):
+            return False
+        clashes = self._conflicts(index, placement)
+        if any(clash > 0 for clash in clashes) or len(clashes) > 2:
+            return False
+
+        bumped = {-clash - 1: self.assigned[-clash - 1] for clash in clashes}
+        for other in bumped:
+            self._unplace(other)
+        self._place(index, placement)
+        replaced = [other for other in bumped if self._place_best(other)]
+
+        if len(replaced) < len(bumped):
+            for other in replaced:
+                self._unplace(other)
+            self._unplace(index)
+            for other, old in bumped.items():
+                self._place(other, old)
+            return False
+        return True
+
+    def _improve(self, index):
+        # Move a session onto its preferred instructor if that is now possible
+        session = self.sessions[index]
+        current = self.assigned[index]
+        self._unplace(index)
+        for count, placement in enumerate(self.candidates[index]):
+            if self._out_of_time(count) or self._cost(session, placement) >= self._cost(session, current):
+                break
+            if self._feasible(index, placement):
+                self._place(index, placement)
+                return True
+        self._place(index, current)
+        return False
+
+    def solve(self, time_budget=5.0):
+        started = time.monotonic()
+        deadline = self.deadline = started + time_budget
+        iterations = 0
+
+        # Most constrained sessions first; sessions not reached within the
+        # budget are reported unassigned
+        order = sorted(range(len(self.sessions)), key=lambda i: len(self.candidates[i]))
+        for index in order:
+            if time.monotonic() >= deadline:
+                break
+            self._place_best(index)
+
+        while time.monotonic() < deadline:
+            unassigned = [i for i in range(len(self.sessions))
+                          if i not in self.assigned and self.candidates[i]]
+            if unassigned:
+                self._repair(self.random.choice(unassigned))
+            else:
+                improvable = [i for i, placement in self.assigned.items()
+                              if self._cost(self.sessions[i], placement)[0]]
+                if not improvable or not any(self._improve(i) for i in improvable):
+                    break
+            iterations += 1
+
+        return {
+            'schedules': [self._row(i, placement) for i, placement in sorted(self.assigned.items())],
+            'unassigned': [{'demand_index': self.sessions[i].demand_index, 'minutes': self.sessions[i].minutes}
+                           for i in range(len(self.sessions)) if i not in self.assigned],
+            'stats': {
+                'sessions': len(self.sessions),
+                'assigned': len(self.assigned),
+                'preferred_instructor': sum(not self._cost(self.sessions[i], placement)[0]
+                                            for i, placement in self.assigned.items()),
+                'iterations': iterations,
+                'elapsed': round(time.monotonic() - started, 3)
+            }
+        }
+
+    def _row(self, index, placement):
+        # Same shape as the rows accepted by POST /api/schedules/bulk
+        session = self.sessions[index]
+        demand = self.demands[session.demand_index]
+        return {
+            'semester_id': self.semester_id,
+            'course_id': int(demand['course_id']),
+            'section_id': int(demand['section_id']),
+            'lab_room_id': placement.lab_room_id,
+            'instructor_id': placement.instructor_id,
+            'day_of_week': placement.day_of_week,
+            'start_time': to_clock(placement.start).strftime('%H:%M'),
+            'end_time': to_clock(placement.start + session.minutes).strftime('%H:%M'),
+            'is_lab': demand.get('is_lab', True),
+            'demand_index': session.demand_index
+        }
@@ -0,0 +1,81 @@
+from datetime import datetime
+from threading import Thread
+import json
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import User, UserImport, user_roles
+from password_hashing import password_hasher
+
+def insert_users(rows, role_ids, results):
+    # Insert (index, values, password_hash) rows and their role links; the new
+    # ids are read back by email since MySQL has no INSERT ... RETURNING
+    db.session.execute(insert(User), [
+        dict({field: values[field] for field in ('email', 'student_id', 'first_name', 'last_name', 'classification')},
+             password_hash=password_hash)
+        for _, values, password_hash in rows
+    ])
+    new_ids = dict(db.session.execute(
+        select(User.email, User.id).where(User.email.in_([values['email'] for _, values, _ in rows]))
+    ).all())
+    db.session.execute(insert(user_roles), [
+        {'user_id': new_ids[values['email']], 'role_id': role_ids[name]}
+        for _, values, _ in rows for name in dict.fromkeys(values['roles'])
+    ])
+    for index, values, _ in rows:
+        results[index] = {'index': index, 'status': 'created', 'id': new_ids[values['email']]}
+
+def _save_progress(import_id, results, status):
+    db.session.execute(update(UserImport).where(UserImport.id == import_id).values(
+        status=status,
+        created=sum(result['status'] == 'created' for result in results),
+        failed=sum(result['status'] == 'error' for result in results),
+        results=json.dumps(results),
+        updated_at=datetime.utcnow()
+    ))
+    db.session.commit()
+
+def _run_import(app, import_id, accepted, role_ids, results):
+    with app.app_context():
+        batch_size = app.config.get('USER_BULK_BATCH_SIZE', 100)
+        items = list(accepted.items())
+        try:
+            # Each batch is hashed, inserted and committed on its own, so the
+            # report shows progress and a late duplicate only fails its batch
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                hashes = password_hasher.hash_many([values['password'] for _, values in batch])
+                try:
+                    insert_users([(index, values, password_hash)
+                                  for (index, values), password_hash in zip(batch, hashes)], role_ids, results)
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    for index, _ in batch:
+                        results[index] = {'index': index, 'status': 'error',
+                                          'error': 'Email or student ID registered meanwhile, please retry'}
+                _save_progress(import_id, results, 'running')
+            _save_progress(import_id, results, 'finished')
+        except Exception:
+            db.session.rollback()
+            _save_progress(import_id, results, 'failed')
+            raise
+        finally:
+            db.session.remove()
+
+def start_import(app, created_by, accepted, role_ids, results):
+    # Record the upload and process it on a background thread; rows not yet
+    # reached are reported as pending. The thread lives in this worker process,
+    # so an import interrupted by a restart stays "running" with a stale updated_at.
+    for index in accepted:
+        results[index] = {'index': index, 'status': 'pending'}
+    user_import = UserImport(created_by=created_by, status='running', total=len(results),
+                             failed=len(results) - len(accepted), results=json.dumps(results))
+    db.session.add(user_import)
+    db.session.commit()
+
+    Thread(target=_run_import, args=(app, user_import.id, accepted, role_ids, results),
+           name=f'user-import-{user_import.id}', daemon=True).start()
+    return user_import
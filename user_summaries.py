@@ -0,0 +1,54 @@
+from types import MappingProxyType
+
+from sqlalchemy import select
+
+from cache import reference_cache
+from extensions import db
+from models import Role, Permission, ProfilePic, role_permissions, user_roles
+
+def _load_role_map():
+    rows = db.session.execute(
+        select(Role.id, Role.name, Permission.name)
+        .outerjoin(role_permissions, role_permissions.c.role_id == Role.id)
+        .outerjoin(Permission, Permission.id == role_permissions.c.permission_id)
+        .order_by(Role.id, Permission.id)
+    ).all()
+
+    roles = {}
+    for role_id, role_name, permission_name in rows:
+        name, permissions = roles.setdefault(role_id, (role_name, []))
+        if permission_name is not None:
+            permissions.append(permission_name)
+    return MappingProxyType({role_id: (name, tuple(permissions)) for role_id, (name, permissions) in roles.items()})
+
+def role_permission_map():
+    # Read-only role id -> (name, permission names), shared by every request.
+    # Kept with the other role data, so create_role rebuilds it.
+    return reference_cache.get_or_load(('roles', 'permission-map'), _load_role_map)
+
+def user_summaries(users, fields=None):
+    # Serialize a user listing in a fixed number of queries: the role ids and
+    # profile picture owners of all listed users are read once each, role
+    # names and permissions come from the cached role map
+    ids = [user.id for user in users]
+    role_ids = {user_id: [] for user_id in ids}
+    pictures = set()
+    roles = {}
+
+    if ids and (fields is None or 'roles' in fields or 'permissions' in fields):
+        for user_id, role_id in db.session.execute(
+                select(user_roles.c.user_id, user_roles.c.role_id)
+                .where(user_roles.c.user_id.in_(ids))
+                .order_by(user_roles.c.role_id)):
+            role_ids[user_id].append(role_id)
+
+        roles = role_permission_map()
+        if any(role_id not in roles for assigned in role_ids.values() for role_id in assigned):
+            # A role created by another worker since the map was built
+            reference_cache.invalidate('roles')
+            roles = role_permission_map()
+
+    if ids and (fields is None or 'has_profile_pic' in fields):
+        pictures = set(db.session.execute(select(ProfilePic.id).where(ProfilePic.id.in_(ids))).scalars())
+
+    return [user.to_summary_dict(role_ids[user.id], roles, user.id in pictures, fields) for user in users]
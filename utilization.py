@@ -0,0 +1,67 @@
+import numpy as np
+
+from occupancy import SLOT_MINUTES
+
+def utilization_report(rows, semester_ids, rooms, days, window_start, window_end):
+    # rows: (semester_id, lab_room_id, day_of_week, start_time, end_time) tuples.
+    # Builds a semesters x rooms x days x slots occupancy array in one vectorized
+    # pass and reduces it to per-room, per-day and per-hour utilization.
+    first_slot = window_start // SLOT_MINUTES
+    slot_count = window_end // SLOT_MINUTES - first_slot
+    semester_index = {semester_id: i for i, semester_id in enumerate(semester_ids)}
+    room_index = {room_id: i for i, (room_id, _) in enumerate(rooms)}
+    day_index = {day: i for i, day in enumerate(days)}
+
+    rows = [row for row in rows
+            if row[0] in semester_index and row[1] in room_index and row[2] in day_index]
+    if rows:
+        columns = list(zip(*rows))
+        s = np.fromiter((semester_index[v] for v in columns[0]), dtype=np.intp, count=len(rows))
+        r = np.fromiter((room_index[v] for v in columns[1]), dtype=np.intp, count=len(rows))
+        d = np.fromiter((day_index[v] for v in columns[2]), dtype=np.intp, count=len(rows))
+        start = np.fromiter((t.hour * 60 + t.minute for t in columns[3]), dtype=np.intp, count=len(rows))
+        end = np.fromiter((t.hour * 60 + t.minute for t in columns[4]), dtype=np.intp, count=len(rows))
+
+        # Slot range of each schedule, clipped to the window (partial slots count)
+        start = np.clip(start // SLOT_MINUTES - first_slot, 0, slot_count)
+        end = np.clip(-(-end // SLOT_MINUTES) - first_slot, 0, slot_count)
+    else:
+        s = r = d = start = end = np.zeros(0, dtype=np.intp)
+
+    # Difference array along the slot axis, then a running sum gives how many
+    # schedules cover each slot
+    shape = (len(semester_ids), len(rooms), len(days), slot_count + 1)
+    coverage = np.zeros(shape, dtype=np.int32)
+    np.add.at(coverage, (s, r, d, start), 1)
+    np.add.at(coverage, (s, r, d, end), -1)
+    occupied = np.cumsum(coverage, axis=3)[..., :slot_count] > 0
+
+    by_room = occupied.mean(axis=(0, 2, 3)) if occupied.size else np.zeros(len(rooms))
+    by_room_day = occupied.mean(axis=(0, 3)) if occupied.size else np.zeros((len(rooms), len(days)))
+    by_day = occupied.mean(axis=(0, 1, 3)) if occupied.size else np.zeros(len(days))
+    by_slot = occupied.mean(axis=(0, 1, 2)) if occupied.size else np.zeros(slot_count)
+
+    # Hourly utilization across all rooms and days
+    slot_hours = (first_slot + np.arange(slot_count)) // (60 // SLOT_MINUTES)
+    hours, hour_of_slot = np.unique(slot_hours, return_inverse=True)
+    hourly = np.bincount(hour_of_slot, weights=by_slot) / np.bincount(hour_of_slot)
+    by_hour = list(zip(hours.tolist(), hourly.tolist()))
+    peak = sorted(by_hour, key=lambda item: item[1], reverse=True)[:3]
+
+    def percent(value):
+        return round(float(value) * 100, 1)
+
+    return {
+        'slot_minutes': SLOT_MINUTES,
+        'overall_utilization': percent(occupied.mean()) if occupied.size else 0.0,
+        'lab_rooms': [{
+            'lab_room_id': room_id,
+            'lab_room_name': name,
+            'utilization': percent(by_room[i]),
+            'idle': percent(1 - by_room[i]),
+            'by_day': {day: percent(by_room_day[i][j]) for j, day in enumerate(days)}
+        } for i, (room_id, name) in enumerate(rooms)],
+        'by_day': {day: percent(by_day[j]) for j, day in enumerate(days)},
+        'by_hour': [{'hour': f'{hour:02d}:00', 'utilization': percent(value)} for hour, value in by_hour],
+        'peak_hours': [{'hour': f'{hour:02d}:00', 'utilization': percent(value)} for hour, value in peak]
+    }